@@ -0,0 +1,393 @@
+"""
+語錄圖片的離線效能測試與輸出比對。
+
+以不同長度的中英文引言、多行作者資訊與各種頭像組合渲染語錄圖片，
+列出各階段耗時與記憶體峰值，並逐像素比對 `benchmarks/golden` 中的參考圖片。
+
+    python benchmarks/miq_bench.py --font /path/to/font.ttc
+    python benchmarks/miq_bench.py --update-golden
+
+每個組合在獨立的子行程中執行，記憶體峰值只包含該組合本身。
+參考圖片依字型檔的雜湊值分開存放，缺少參考圖片視為失敗；
+只想量測效能時可加上 `--allow-missing` 略過比對。
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from PIL import Image, ImageChops, ImageDraw
+
+from config import DEFAULT_AVATAR, DISCORD_DEFAULT_AVATAR
+import miq_render
+
+GOLDEN_DIR = os.path.join(PROJECT_ROOT, "benchmarks", "golden")
+# 固定日期，參考圖片才不會每天改變
+DISPLAY_DATE = "2025-01-01"
+FOOTER_TEXT = "Generated by Norvireon"
+# 產生的測試頭像: 名稱 -> (尺寸, 是否透明)
+GENERATED_AVATARS = {
+    "huge_jpeg": ((6000, 4000), False),
+    "transparent_png": ((512, 512), True),
+}
+STAGES = (
+    "decode",
+    "resize",
+    "mask",
+    "composite",
+    "layout",
+    "draw",
+    "encode",
+)
+
+QUOTES = {
+    "latin_short": "Stay hungry, stay foolish.",
+    "latin_long": (
+        "The best way to predict the future is to invent it, and the second best "
+        "way is to measure what you already have before changing anything at all. "
+        "Premature optimization is the root of all evil, yet we should not pass up "
+        "our opportunities in that critical three percent."
+    ),
+    "cjk_short": "人生苦短，我用 Python。",
+    "cjk_long": (
+        "天下難事，必作於易；天下大事，必作於細。是以聖人終不為大，故能成其大。"
+        "合抱之木，生於毫末；九層之臺，起於累土；千里之行，始於足下。"
+        "為者敗之，執者失之。是以聖人無為故無敗，無執故無失。"
+    ),
+}
+
+AUTHORS = {
+    "latin_short": "Steve\nstevej",
+    "latin_long": "Alan Kay, Donald Knuth and a very long list of other people\n@somebody",
+    "cjk_short": "某位工程師\nengineer",
+    "cjk_long": "老子\n道德經 第六十三章、第六十四章",
+}
+
+
+def generated_avatar(size: tuple, transparent: bool) -> bytes:
+    """以漸層產生固定內容的測試頭像。"""
+    width, height = size
+    red = Image.linear_gradient("L").resize(size)
+    green = Image.linear_gradient("L").rotate(90).resize(size)
+    blue = Image.radial_gradient("L").resize(size)
+    output = io.BytesIO()
+    if transparent:
+        alpha = Image.radial_gradient("L").resize(size).point(lambda v: 255 - v)
+        Image.merge("RGBA", (red, green, blue, alpha)).save(output, format="PNG")
+    else:
+        image = Image.merge("RGB", (red, green, blue))
+        ImageDraw.Draw(image).ellipse(
+            (width // 4, height // 4, width * 3 // 4, height * 3 // 4),
+            outline=(255, 255, 255),
+            width=max(1, width // 100),
+        )
+        image.save(output, format="JPEG", quality=90)
+    return output.getvalue()
+
+
+def avatar_paths(extra_paths: list[str]) -> dict[str, str]:
+    return {
+        "small_png": DISCORD_DEFAULT_AVATAR,
+        "photo_jpeg": DEFAULT_AVATAR,
+        **{os.path.splitext(os.path.basename(p))[0]: p for p in extra_paths},
+    }
+
+
+def avatar_names(extra_paths: list[str]) -> list[str]:
+    return [*avatar_paths(extra_paths), *GENERATED_AVATARS]
+
+
+def write_generated_avatars(directory: str):
+    """預先產生測試頭像，子行程只需讀檔，產生時的記憶體用量不計入量測。"""
+    for name, (size, transparent) in GENERATED_AVATARS.items():
+        with open(os.path.join(directory, name), "wb") as f:
+            f.write(generated_avatar(size, transparent))
+
+
+def load_avatar(name: str, extra_paths: list[str], generated_dir: str) -> bytes:
+    path = avatar_paths(extra_paths).get(name, os.path.join(generated_dir, name))
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def render_case(quote: str, author: str, avatar: bytes, output_format: str):
+    """渲染一次並回傳 (各階段耗時, 輸出結果)。"""
+    timings = {}
+    avatar_rgba = miq_render.prepare_avatar(avatar, timings=timings)
+    if avatar_rgba is None:
+        raise RuntimeError("prepare_avatar failed")
+
+    # 清除蒙版快取以量測冷啟動時的蒙版計算
+    miq_render._build_black_mask.cache_clear()
+    started = time.perf_counter()
+    miq_render.create_black_mask(
+        miq_render.CANVAS_WIDTH,
+        miq_render.CANVAS_HEIGHT,
+        (
+            int(miq_render.VIGNETTE_MASK_CENTER_X),
+            int(miq_render.VIGNETTE_MASK_CENTER_Y),
+        ),
+        miq_render.VIGNETTE_MASK_RADIUS_PIXELS,
+        miq_render.VIGNETTE_GRADIENT_START_RATIO,
+    )
+    timings["mask"] = time.perf_counter() - started
+
+    result = miq_render.render_quote(
+        quote,
+        author,
+        avatar_rgba,
+        footer_text=FOOTER_TEXT,
+        output_format=output_format,
+        display_date=DISPLAY_DATE,
+        timings=timings,
+    )
+    if result is None:
+        raise RuntimeError("render_quote failed")
+    return timings, result
+
+
+def golden_dir(font_path: str) -> str:
+    """目前字型的參考圖片目錄，以字型檔名與內容雜湊命名。"""
+    with open(font_path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:12]
+    font_name = os.path.splitext(os.path.basename(font_path))[0]
+    return os.path.join(GOLDEN_DIR, f"{font_name}-{digest}")
+
+
+def compare_golden(
+    name: str,
+    data: bytes,
+    directory: str,
+    tolerance: int,
+    update: bool,
+    allow_missing: bool,
+) -> str:
+    """與參考圖片逐像素比對，回傳比對結果的說明。"""
+    path = os.path.join(directory, f"{name}.png")
+    if update:
+        os.makedirs(directory, exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        return "updated"
+    if not os.path.exists(path):
+        return "skip" if allow_missing else "MISSING"
+
+    with Image.open(path) as golden_file:
+        golden = golden_file.convert("RGBA")
+    actual = Image.open(io.BytesIO(data)).convert("RGBA")
+    if golden.size != actual.size:
+        return f"FAIL size {actual.size} != {golden.size}"
+
+    # 每個像素取各通道中最大的差異
+    bands = ImageChops.difference(golden, actual).split()
+    diff = bands[0]
+    for band in bands[1:]:
+        diff = ImageChops.lighter(diff, band)
+    histogram = diff.histogram()
+    changed = sum(histogram[tolerance + 1 :])
+    max_diff = max(value for value, count in enumerate(histogram) if count)
+    if changed:
+        return f"FAIL {changed} px (max diff {max_diff})"
+    return "ok" if max_diff == 0 else f"ok (max diff {max_diff})"
+
+
+def peak_rss_mb() -> float | None:
+    # Linux 的 ru_maxrss 在 fork 後會沿用父行程的峰值，改讀本行程自己的 VmHWM
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 以位元組為單位，Linux 以 KB 為單位
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def run_case(args, name: str) -> dict:
+    """在目前的行程中量測單一組合，由子行程呼叫。"""
+    quote_name, avatar_name = name.split("-", 1)
+    avatar = load_avatar(avatar_name, args.avatar, args.generated_dir)
+
+    # 預先載入字型與 Pillow，避免匯入成本計入量測結果
+    render_case(
+        "warmup",
+        "warmup",
+        load_avatar("small_png", [], args.generated_dir),
+        args.format,
+    )
+    baseline = peak_rss_mb()
+
+    runs = []
+    for _ in range(args.repeat):
+        timings, result = render_case(
+            QUOTES[quote_name], AUTHORS[quote_name], avatar, args.format
+        )
+        runs.append(timings)
+    peak = peak_rss_mb()
+
+    _, golden_result = render_case(
+        QUOTES[quote_name], AUTHORS[quote_name], avatar, "png"
+    )
+    return {
+        "medians": {
+            stage: statistics.median(run.get(stage, 0.0) for run in runs)
+            for stage in STAGES
+        },
+        "size": result["size"],
+        "rss": peak,
+        "rss_delta": peak - baseline if peak is not None else None,
+        "golden": compare_golden(
+            name,
+            golden_result["data"],
+            golden_dir(miq_render.FONT_PATH),
+            args.tolerance,
+            args.update_golden,
+            args.allow_missing,
+        ),
+    }
+
+
+def spawn_case(name: str, generated_dir: str) -> dict:
+    """以新的子行程執行單一組合，回傳其量測結果。"""
+    completed = subprocess.run(
+        [
+            sys.executable,
+            os.path.abspath(__file__),
+            *sys.argv[1:],
+            "--case",
+            name,
+            "--generated-dir",
+            generated_dir,
+        ],
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        error = completed.stderr.strip().splitlines() or ["unknown error"]
+        return {"error": error[-1]}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def format_mb(value: float | None) -> str:
+    return f"{value:>8.0f}" if value is not None else f"{'-':>8}"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="MIQ 語錄圖片效能測試")
+    parser.add_argument("--font", help="字型檔路徑，預設為 config.FONT_PATH")
+    parser.add_argument("--repeat", type=int, default=3, help="每個組合的量測次數")
+    parser.add_argument(
+        "--format",
+        default=miq_render.OUTPUT_FORMAT,
+        choices=sorted(miq_render.OUTPUT_EXTENSIONS),
+        help="量測時的輸出格式，比對時一律使用 PNG",
+    )
+    parser.add_argument("--avatar", action="append", default=[], help="額外的頭像檔")
+    parser.add_argument("--filter", default="", help="只執行名稱包含此字串的組合")
+    parser.add_argument(
+        "--tolerance", type=int, default=0, help="容許的單一通道像素差異"
+    )
+    parser.add_argument(
+        "--update-golden", action="store_true", help="以目前的輸出更新參考圖片"
+    )
+    parser.add_argument(
+        "--allow-missing",
+        action="store_true",
+        help="缺少參考圖片時略過比對，不視為失敗",
+    )
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    parser.add_argument("--generated-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.font:
+        miq_render.FONT_PATH = args.font
+    if not os.path.exists(miq_render.FONT_PATH):
+        parser.error(f"找不到字型檔: {miq_render.FONT_PATH}，請以 --font 指定")
+
+    if args.case:
+        print(json.dumps(run_case(args, args.case)))
+        return 0
+
+    cases = [
+        f"{quote_name}-{avatar_name}"
+        for quote_name in QUOTES
+        for avatar_name in avatar_names(args.avatar)
+        if args.filter in f"{quote_name}-{avatar_name}"
+    ]
+
+    header = (
+        f"{'case':<32}"
+        + "".join(f"{stage:>10}" for stage in STAGES)
+        + f"{'total':>10}{'size KB':>9}{'rss MB':>8}{'+rss MB':>8}  golden"
+    )
+    print(header)
+    print("-" * len(header))
+
+    failures = 0
+    missing = 0
+    skipped = 0
+    with tempfile.TemporaryDirectory() as generated_dir:
+        write_generated_avatars(generated_dir)
+        for name in cases:
+            result = spawn_case(name, generated_dir)
+            if "error" in result:
+                failures += 1
+                print(f"{name:<32}FAIL {result['error']}")
+                continue
+
+            medians = result["medians"]
+            status = result["golden"]
+            if status.startswith("FAIL"):
+                failures += 1
+            elif status == "MISSING":
+                missing += 1
+            elif status == "skip":
+                skipped += 1
+            print(
+                f"{name:<32}"
+                + "".join(f"{medians[stage] * 1000:>10.1f}" for stage in STAGES)
+                + f"{sum(medians.values()) * 1000:>10.1f}"
+                + f"{result['size'] / 1024:>9.0f}"
+                + format_mb(result["rss"])
+                + format_mb(result["rss_delta"])
+                + f"  {status}"
+            )
+
+    print(f"\n耗時為 {args.repeat} 次量測的中位數 (ms)，mask 為未快取時的計算時間")
+    print("rss MB 為該組合子行程的記憶體峰值，+rss MB 為扣除暖機後增加的部分")
+    golden_path = os.path.relpath(golden_dir(miq_render.FONT_PATH), PROJECT_ROOT)
+    if skipped:
+        print(f"{skipped} 個組合在 {golden_path} 沒有參考圖片，已略過比對")
+    if missing:
+        print(
+            f"{missing} 個組合在 {golden_path} 沒有參考圖片，"
+            "請以 --update-golden 產生並提交，或以 --allow-missing 略過比對"
+        )
+    if failures:
+        print(f"{failures} 個組合失敗或與參考圖片不符")
+        if not args.update_golden:
+            print("確認輸出正確後，以 --update-golden 更新參考圖片")
+    return 1 if failures or missing else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
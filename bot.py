@@ -1,13 +1,21 @@
+import time
+
+# 在其他匯入之前記錄啟動時間，用於計算上線所需時間
+PROCESS_STARTED = time.perf_counter()
+
 import asyncio
+import datetime
 import discord
 from discord.ext import commands
+import hashlib
+import importlib.machinery
+import json
 import os
 from dotenv import load_dotenv
 import logging
+import import_timing
+from config import PROJECT_ROOT
 from logging_config import setup_logging
-from mongo_crud import MongoCRUD
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
 
 
 _log = logging.getLogger(__name__)
@@ -20,6 +28,9 @@ intents = discord.Intents.all()
 
 bot = commands.Bot(command_prefix=DEFAULT_PREFIX, intents=intents)
 
+# 上次同步的指令樹雜湊值，指令沒有變更時略過同步
+COMMAND_HASH_PATH = os.path.join(PROJECT_ROOT, ".command_tree_hash")
+
 
 async def load_all_cogs(bot_instance):
     cogs_base_dir = "cogs"
@@ -28,22 +39,79 @@ async def load_all_cogs(bot_instance):
         if os.path.isdir(item_path) and "__init__.py" in os.listdir(item_path):
             module_path = f"{cogs_base_dir}.{item_name}"
             try:
+                started = time.perf_counter()
                 await bot_instance.load_extension(module_path)
-                _log.info(f"Loaded Cog Package: {module_path}")
+                elapsed = time.perf_counter() - started
+                import_timing.record(module_path, elapsed)
+                _log.info(
+                    f"Loaded Cog Package: {module_path} ({elapsed * 1000:.0f} ms)"
+                )
             except Exception as e:
                 _log.error(
                     f"Failed to load Cog Package {module_path}: {e}", exc_info=True
                 )
 
 
+def get_command_tree_hash(
+    tree: discord.app_commands.CommandTree, application_id: int | None
+) -> str:
+    """計算所有全域指令定義的雜湊值，換用其他應用程式時雜湊值也會不同。"""
+    commands_payload = sorted(
+        (command.to_dict(tree) for command in tree.get_commands()),
+        key=lambda command: (command.get("type", 1), command["name"]),
+    )
+    payload = {"application_id": application_id, "commands": commands_payload}
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+async def sync_command_tree(bot_instance: commands.Bot):
+    """只在指令定義與上次同步時不同時才同步指令樹。"""
+    current_hash = get_command_tree_hash(
+        bot_instance.tree, bot_instance.application_id
+    )
+    try:
+        with open(COMMAND_HASH_PATH, encoding="utf-8") as f:
+            synced_hash = f.read().strip()
+    except FileNotFoundError:
+        synced_hash = None
+
+    if current_hash == synced_hash:
+        _log.info("Command tree unchanged, skipping sync.")
+        return
+
+    _log.info("syncing...")
+    started = time.perf_counter()
+    try:
+        await bot_instance.tree.sync()
+    except Exception as e:
+        # 同步失敗 (速率限制、伺服器錯誤、缺少權限) 不影響啟動，
+        # 也不寫入雜湊值，下次啟動時會再同步
+        _log.error(f"Failed to sync command tree: {e}", exc_info=True)
+        return
+    _log.info(f"Command tree synced ({time.perf_counter() - started:.2f} s)")
+    with open(COMMAND_HASH_PATH, "w", encoding="utf-8") as f:
+        f.write(current_hash)
+
+
 @bot.event
-async def on_ready():
-    setup_logging()
+async def setup_hook():
+    # 只在啟動時執行一次，重新連線不會重複載入
+    bot.start_time = datetime.datetime.now(datetime.timezone.utc)
     await load_all_cogs(bot)
+    await sync_command_tree(bot)
+
+
+@bot.event
+async def on_ready():
     _log.info(f"Logged in as {bot.user.name} ({bot.user.id})")
-    _log.info("syncing...")
-    await bot.tree.sync()
-    _log.info(">>Bot is online<<")
+    if not hasattr(bot, "time_to_online"):
+        bot.time_to_online = time.perf_counter() - PROCESS_STARTED
+        _log.info(f">>Bot is online<< ({bot.time_to_online:.2f} s after start)")
+        for name, elapsed in import_timing.get_import_times()[:5]:
+            _log.info(f"Load time: {name} {elapsed * 1000:.0f} ms")
+    else:
+        _log.info(">>Bot is online<<")
 
 
 @bot.event
@@ -52,5 +120,10 @@ async def on_disconnect():
 
 
 if __name__ == "__main__":
+    # spawn 啟動的子行程預設會以 __mp_main__ 重新執行本檔案，載入 discord 並建立 Bot；
+    # 將主模組標記為 "__main__" 模組，子行程便只匯入工作函式所在的模組
+    __spec__ = importlib.machinery.ModuleSpec("__main__", None)
+    setup_logging()
+    import_timing.record("bot", time.perf_counter() - PROCESS_STARTED)
     if TOKEN:
-        bot.run(TOKEN)
+        bot.run(TOKEN, log_handler=None)
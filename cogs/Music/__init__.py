@@ -1,5 +1,6 @@
 from discord.ext import commands
 from .core.music_main import Music
+from .core.music_scheduler import ffmpeg_scheduler
 from .core.music_setup import MusicSetup
 import logging
 
@@ -14,5 +15,6 @@ async def setup(bot: commands.Bot) -> None:
             print("a")
         except Exception as e:
             logger.error(f"cleaning VC connect error: {e}")
+    ffmpeg_scheduler.reap_orphans()
     await bot.add_cog(Music(bot))
     await bot.add_cog(MusicSetup(bot))
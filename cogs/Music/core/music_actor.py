@@ -0,0 +1,147 @@
+import asyncio
+import collections
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("Music_Actor")
+
+# 信箱清空後，工作協程再等待多久才結束 (秒)
+ACTOR_IDLE_SECONDS = 60
+
+# 連續送出時可以合併成一次執行的操作
+MERGEABLE_OPS = {"pause", "resume", "play_next", "start"}
+# 合併時會把次數傳給處理函式的操作
+COUNTED_OPS = {"skip", "toggle"}
+
+# 尚未執行就被停止取代的操作會得到此結果，呼叫端應告知使用者操作已取消
+CANCELLED = object()
+
+
+class Message:
+    def __init__(self, op: str, kwargs: dict):
+        self.op = op
+        self.kwargs = kwargs
+        self.count = 1
+        self.futures: list[asyncio.Future] = []
+
+
+class GuildActor:
+    """
+    單一伺服器的音樂指令信箱。
+
+    同一伺服器的操作依序執行，連續的相同操作會合併：
+    多次跳過合併為一次跳過多首，多次切換暫停只看次數的奇偶，
+    停止會取代所有尚未執行的操作。
+    """
+
+    def __init__(self, guild_id: int, registry: "ActorRegistry"):
+        self.guild_id = guild_id
+        self.registry = registry
+        self.mailbox: collections.deque[Message] = collections.deque()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    def submit(self, op: str, **kwargs) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        last = self.mailbox[-1] if self.mailbox else None
+
+        carried = []
+        if op == "stop":
+            # 停止之後其他操作都沒有意義；尚未執行的停止與這次合併
+            for message in self.mailbox:
+                if message.op == "stop":
+                    carried.extend(message.futures)
+                    continue
+                for pending in message.futures:
+                    if not pending.done():
+                        pending.set_result(CANCELLED)
+            self.mailbox.clear()
+            last = None
+
+        if last is not None and last.op == op and op in MERGEABLE_OPS | COUNTED_OPS:
+            last.count += 1
+            self.registry.stats["coalesced"] += 1
+        elif last is not None and last.op == op == "seek":
+            last.kwargs = kwargs
+            self.registry.stats["coalesced"] += 1
+        else:
+            last = Message(op, kwargs)
+            self.mailbox.append(last)
+        last.futures.extend(carried)
+        last.futures.append(future)
+        self.registry.stats["submitted"] += 1
+        self._wakeup.set()
+        return future
+
+    async def _run(self):
+        try:
+            while True:
+                if not self.mailbox:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), ACTOR_IDLE_SECONDS)
+                    except asyncio.TimeoutError:
+                        if not self.mailbox:
+                            return
+                    continue
+                message = self.mailbox.popleft()
+                await self._handle(message)
+        finally:
+            self.registry._remove(self)
+
+    async def _handle(self, message: Message):
+        handler = self.registry.handlers.get(message.op)
+        try:
+            if handler is None:
+                raise KeyError(f"Unknown music operation: {message.op}")
+            if message.op in COUNTED_OPS:
+                result = await handler(self.guild_id, count=message.count)
+            else:
+                result = await handler(self.guild_id, **message.kwargs)
+            self.registry.stats["handled"] += 1
+            for future in message.futures:
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            logger.error(f"{message.op} failed for guild {self.guild_id}: {e}")
+            for future in message.futures:
+                if not future.done():
+                    future.set_exception(e)
+
+
+class ActorRegistry:
+    """建立並管理每個伺服器的 `GuildActor`，不同伺服器之間互不阻塞。"""
+
+    def __init__(self):
+        self.handlers: dict = {}
+        self.stats = {"submitted": 0, "handled": 0, "coalesced": 0}
+        self._actors: dict[int, GuildActor] = {}
+
+    def register_handler(self, op: str, handler):
+        self.handlers[op] = handler
+
+    def submit(self, guild_id: int, op: str, **kwargs) -> asyncio.Future:
+        """
+        將操作送入伺服器的信箱，回傳操作完成時的結果。
+
+        :param op: 操作名稱，例如 `skip`、`toggle`、`stop`、`play_next`。
+        """
+        actor = self._actors.get(guild_id)
+        if actor is None:
+            actor = GuildActor(guild_id, self)
+            self._actors[guild_id] = actor
+        return actor.submit(op, **kwargs)
+
+    def summary(self) -> dict:
+        return {
+            "actors": len(self._actors),
+            "pending": sum(len(a.mailbox) for a in self._actors.values()),
+            **self.stats,
+        }
+
+    def _remove(self, actor: GuildActor):
+        if self._actors.get(actor.guild_id) is actor:
+            del self._actors[actor.guild_id]
+
+
+music_actors = ActorRegistry()
@@ -0,0 +1,212 @@
+import io
+import logging
+import os
+import re
+import threading
+import time
+import weakref
+
+import requests
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("Music_Buffer")
+
+# 設為 0 可停用預讀緩衝，讓 FFmpeg 直接讀取遠端網址
+READAHEAD_ENABLED = os.getenv("MUSIC_READAHEAD", "1") != "0"
+# 緩衝區容量，也是暫停下載的高水位
+BUFFER_SIZE = int(os.getenv("MUSIC_BUFFER_SIZE", str(4 * 1024**2)))
+# 緩衝量低於此值時恢復下載；開始播放前與斷流後也會先累積到此值
+LOW_WATERMARK = int(os.getenv("MUSIC_BUFFER_LOW_WATERMARK", str(256 * 1024)))
+# 每個 Range 請求的大小，避免單一長連線被上游限速或中斷
+RANGE_SIZE = int(os.getenv("MUSIC_BUFFER_RANGE_SIZE", str(10 * 1024**2)))
+MAX_RETRIES = int(os.getenv("MUSIC_BUFFER_MAX_RETRIES", "5"))
+
+READ_CHUNK_SIZE = 64 * 1024
+REQUEST_TIMEOUT = (5, 10)
+
+_active_buffers: "weakref.WeakSet[ReadAheadBuffer]" = weakref.WeakSet()
+buffer_totals = {"underruns": 0, "reconnects": 0, "bytes_fetched": 0, "failures": 0}
+
+
+class ReadAheadBuffer(io.BufferedIOBase):
+    """
+    位於 HTTP 音源與 FFmpeg stdin 之間的預讀緩衝。
+
+    背景執行緒以 Range 請求持續下載到高水位，斷線時從目前位置續傳；
+    FFmpeg 的寫入執行緒透過 `read` 取資料，緩衝見底時會先重新累積到低水位。
+    """
+
+    def __init__(
+        self,
+        url: str,
+        size: int = BUFFER_SIZE,
+        low_watermark: int = LOW_WATERMARK,
+    ):
+        super().__init__()
+        self.url = url
+        self.size = size
+        self.low_watermark = min(low_watermark, size)
+        self.stats = {"underruns": 0, "reconnects": 0, "bytes_fetched": 0}
+        self._buffer = bytearray()
+        self._position = 0
+        self._total_length: int | None = None
+        self._eof = False
+        self._closed_event = threading.Event()
+        self._priming = True
+        self._cond = threading.Condition()
+        self._session = requests.Session()
+        self._thread = threading.Thread(
+            target=self._run, daemon=True, name="music-readahead"
+        )
+        _active_buffers.add(self)
+        self._thread.start()
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        with self._cond:
+            while not self._closed_event.is_set():
+                buffered = len(self._buffer)
+                if self._eof:
+                    break
+                if self._priming:
+                    if buffered >= self.low_watermark:
+                        self._priming = False
+                        break
+                elif buffered > 0:
+                    break
+                else:
+                    # 緩衝見底，重新累積到低水位再交給 FFmpeg，避免斷斷續續
+                    self.stats["underruns"] += 1
+                    buffer_totals["underruns"] += 1
+                    self._priming = True
+                    logger.warning(f"預讀緩衝見底，重新緩衝中 ({self.url[:50]}...)")
+                self._cond.wait(timeout=1)
+
+            if self._closed_event.is_set():
+                return b""
+            if size is None or size < 0:
+                size = len(self._buffer)
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+            self._cond.notify_all()
+            return data
+
+    def close(self):
+        if not self._closed_event.is_set():
+            self._closed_event.set()
+            with self._cond:
+                self._cond.notify_all()
+            self._session.close()
+        super().close()
+
+    def health(self) -> dict:
+        """回傳緩衝狀態，供監控使用。"""
+        with self._cond:
+            buffered = len(self._buffer)
+        return {
+            "buffered_bytes": buffered,
+            "fill_ratio": buffered / self.size if self.size else 0.0,
+            "position": self._position,
+            "total_length": self._total_length,
+            "eof": self._eof,
+            **self.stats,
+        }
+
+    def _run(self):
+        retries = 0
+        while not self._closed_event.is_set() and not self._eof:
+            with self._cond:
+                # 高水位暫停下載，直到低於低水位才恢復
+                if len(self._buffer) >= self.size:
+                    while (
+                        len(self._buffer) > self.low_watermark
+                        and not self._closed_event.is_set()
+                    ):
+                        self._cond.wait(timeout=1)
+            if self._closed_event.is_set():
+                break
+
+            try:
+                self._fetch_range()
+                retries = 0
+            except requests.RequestException as e:
+                retries += 1
+                self.stats["reconnects"] += 1
+                buffer_totals["reconnects"] += 1
+                if retries > MAX_RETRIES:
+                    logger.error(f"預讀緩衝重試次數用盡，停止下載: {e}")
+                    buffer_totals["failures"] += 1
+                    self._finish()
+                    break
+                logger.warning(
+                    f"預讀緩衝連線中斷，從 {self._position} bytes 續傳 "
+                    f"({retries}/{MAX_RETRIES}): {e}"
+                )
+                self._closed_event.wait(min(2**retries * 0.25, 5))
+
+    def _fetch_range(self):
+        start = self._position
+        end = start + RANGE_SIZE - 1
+        if self._total_length is not None:
+            end = min(end, self._total_length - 1)
+        headers = {"Range": f"bytes={start}-{end}"}
+
+        with self._session.get(
+            self.url, headers=headers, stream=True, timeout=REQUEST_TIMEOUT
+        ) as response:
+            if response.status_code == 416:
+                self._finish()
+                return
+            response.raise_for_status()
+
+            ranged = response.status_code == 206
+            if ranged:
+                match = re.search(r"/(\d+)$", response.headers.get("Content-Range", ""))
+                if match:
+                    self._total_length = int(match.group(1))
+            # 伺服器不支援 Range 時會回傳整個檔案，需略過已下載的部分
+            skip = 0 if ranged else start
+
+            for chunk in response.iter_content(READ_CHUNK_SIZE):
+                if skip:
+                    dropped = min(skip, len(chunk))
+                    chunk = chunk[dropped:]
+                    skip -= dropped
+                if not chunk:
+                    continue
+                with self._cond:
+                    while (
+                        len(self._buffer) >= self.size
+                        and not self._closed_event.is_set()
+                    ):
+                        self._cond.wait(timeout=1)
+                    if self._closed_event.is_set():
+                        return
+                    self._buffer += chunk
+                    self._position += len(chunk)
+                    self.stats["bytes_fetched"] += len(chunk)
+                    buffer_totals["bytes_fetched"] += len(chunk)
+                    self._cond.notify_all()
+
+        if not ranged or (
+            self._total_length is not None and self._position >= self._total_length
+        ):
+            self._finish()
+
+    def _finish(self):
+        with self._cond:
+            self._eof = True
+            self._cond.notify_all()
+
+
+def get_buffer_health() -> dict:
+    """回傳所有使用中緩衝的狀態與累計指標。"""
+    buffers = [buf.health() for buf in list(_active_buffers) if not buf.closed]
+    return {
+        "active": len(buffers),
+        "min_fill_ratio": min((b["fill_ratio"] for b in buffers), default=None),
+        "buffers": buffers,
+        **buffer_totals,
+    }
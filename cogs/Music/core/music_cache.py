@@ -0,0 +1,271 @@
+import asyncio
+import json
+import logging
+import os
+import time
+
+from executors import ExecutorBusy, http_executor
+from .music_scheduler import ffmpeg_scheduler
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("Music_Cache")
+
+# 未設定快取目錄時停用快取
+CACHE_DIR = os.getenv("MUSIC_CACHE_DIR")
+CACHE_MAX_BYTES = int(os.getenv("MUSIC_CACHE_MAX_BYTES", str(2 * 1024**3)))
+# 同一首歌播放達此次數後才會在背景寫入快取
+CACHE_MIN_PLAYS = int(os.getenv("MUSIC_CACHE_MIN_PLAYS", "3"))
+# lru: 淘汰最久未使用; lfu: 淘汰命中次數最少
+CACHE_EVICTION = os.getenv("MUSIC_CACHE_EVICTION", "lru").lower()
+
+INDEX_FILENAME = "index.json"
+# 索引變更後延遲多久才寫入磁碟 (秒)，期間的變更合併為一次寫入
+INDEX_SAVE_DELAY = float(os.getenv("MUSIC_CACHE_INDEX_SAVE_DELAY", "5"))
+
+
+class AudioCache:
+    """
+    以來源曲目 ID 為鍵、存放已編碼 Opus 檔案的本地音訊快取。
+    """
+
+    def __init__(
+        self, directory: str | None, max_bytes: int, min_plays: int, eviction: str
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.min_plays = min_plays
+        self.eviction = eviction
+        self.entries: dict[str, dict] = {}
+        self.play_counts: dict[str, int] = {}
+        self.stats = {"hits": 0, "misses": 0, "fills": 0, "evictions": 0}
+        self._filling: set[str] = set()
+        # 保留背景工作的參考，避免執行中被回收
+        self._fill_tasks: set[asyncio.Task] = set()
+        self._save_task: asyncio.Task | None = None
+
+        if self.enabled:
+            os.makedirs(self.directory, exist_ok=True)
+            self._load_index()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(entry["size"] for entry in self.entries.values())
+
+    def lookup(
+        self, track_id: str | None, accepted_args: list[list[str]] | None = None
+    ) -> str | None:
+        """
+        回傳快取檔案路徑，未命中時回傳 None。
+
+        :param accepted_args: 指定時，只接受以其中一組編碼參數寫入的快取檔案，
+            其餘視為過期並移除，下次達到播放門檻時重新寫入。
+        """
+        if not self.enabled or not track_id:
+            return None
+        entry = self.entries.get(track_id)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        path = os.path.join(self.directory, entry["file"])
+        if accepted_args is not None and entry.get("encode_args") not in accepted_args:
+            logger.info(f"快取檔案的編碼設定已變更，移除: {track_id}")
+            del self.entries[track_id]
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._save_index()
+            self.stats["misses"] += 1
+            return None
+        if not os.path.exists(path):
+            logger.warning(f"快取檔案遺失，移除索引: {track_id}")
+            del self.entries[track_id]
+            self._save_index()
+            self.stats["misses"] += 1
+            return None
+        entry["last_used"] = time.time()
+        entry["hits"] += 1
+        self.stats["hits"] += 1
+        return path
+
+    def record_play(self, song_data: dict, encode_args: list[str]):
+        """
+        記錄一次播放，達到門檻時在背景把曲目寫入快取。
+
+        :param song_data: 曲目資料，需包含 `track_id` 與 `song_url`。
+        :param encode_args: 寫入快取時使用的 FFmpeg 編碼參數。
+        """
+        track_id = song_data.get("track_id")
+        if not self.enabled or not track_id:
+            return
+        count = self.play_counts.get(track_id, 0) + 1
+        self.play_counts[track_id] = count
+        self._save_index()
+
+        if (
+            count >= self.min_plays
+            and track_id not in self.entries
+            and track_id not in self._filling
+        ):
+            self._filling.add(track_id)
+            task = asyncio.create_task(
+                self._fill(track_id, song_data["song_url"], encode_args)
+            )
+            self._fill_tasks.add(task)
+            task.add_done_callback(self._fill_tasks.discard)
+
+    async def flush(self):
+        """立即寫入尚未儲存的索引，卸載時呼叫。"""
+        if self._save_task is not None and not self._save_task.done():
+            self._save_task.cancel()
+        self._save_task = None
+        if self.enabled and not await self._write_index():
+            _write_file(
+                os.path.join(self.directory, INDEX_FILENAME),
+                json.dumps({"entries": self.entries, "play_counts": self.play_counts}),
+            )
+
+    async def _fill(self, track_id: str, song_url: str, encode_args: list[str]):
+        filename = track_id.replace(":", "_").replace("/", "_") + ".opus"
+        path = os.path.join(self.directory, filename)
+        tmp_path = path + ".part"
+        slot = None
+        try:
+            slot = await ffmpeg_scheduler.acquire("prefetch", timeout=None)
+            logger.info(f"開始寫入音訊快取: {track_id}")
+            process = await asyncio.create_subprocess_exec(
+                "ffmpeg",
+                "-nostdin",
+                "-loglevel",
+                "error",
+                "-y",
+                "-reconnect",
+                "1",
+                "-reconnect_streamed",
+                "1",
+                "-reconnect_delay_max",
+                "5",
+                "-i",
+                song_url,
+                "-vn",
+                "-map_metadata",
+                "-1",
+                *encode_args,
+                "-f",
+                "opus",
+                tmp_path,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            slot.attach(process.pid)
+            _, stderr = await process.communicate()
+            if process.returncode != 0:
+                logger.error(
+                    f"寫入音訊快取失敗 {track_id}: {stderr.decode(errors='ignore')}"
+                )
+                return
+
+            size = os.path.getsize(tmp_path)
+            if size > self.max_bytes:
+                logger.warning(f"曲目大小超過快取上限，略過: {track_id}")
+                return
+            self._evict(size)
+            os.replace(tmp_path, path)
+            self.entries[track_id] = {
+                "file": filename,
+                "size": size,
+                "encode_args": encode_args,
+                "last_used": time.time(),
+                "hits": 0,
+            }
+            self.stats["fills"] += 1
+            self._save_index()
+            logger.info(
+                f"音訊快取寫入完成: {track_id} ({size / 1024**2:.2f} MB, "
+                f"總計 {self.total_bytes / 1024**2:.2f} MB)"
+            )
+        except Exception as e:
+            logger.error(f"寫入音訊快取時發生錯誤 {track_id}: {e}")
+        finally:
+            if slot is not None:
+                slot.release()
+            self._filling.discard(track_id)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _evict(self, incoming: int):
+        while self.entries and self.total_bytes + incoming > self.max_bytes:
+            if self.eviction == "lfu":
+                victim = min(
+                    self.entries,
+                    key=lambda k: (
+                        self.entries[k]["hits"],
+                        self.entries[k]["last_used"],
+                    ),
+                )
+            else:
+                victim = min(self.entries, key=lambda k: self.entries[k]["last_used"])
+            entry = self.entries.pop(victim)
+            try:
+                os.remove(os.path.join(self.directory, entry["file"]))
+            except FileNotFoundError:
+                pass
+            self.stats["evictions"] += 1
+            logger.info(f"淘汰音訊快取: {victim}")
+
+    def _load_index(self):
+        index_path = os.path.join(self.directory, INDEX_FILENAME)
+        try:
+            with open(index_path, encoding="utf-8") as f:
+                index = json.load(f)
+            self.entries = index.get("entries", {})
+            self.play_counts = index.get("play_counts", {})
+            logger.info(f"已載入音訊快取索引，共 {len(self.entries)} 首")
+        except FileNotFoundError:
+            pass
+        except (json.JSONDecodeError, OSError) as e:
+            logger.error(f"讀取音訊快取索引失敗，將重新建立: {e}")
+
+    def _save_index(self):
+        """排程寫入索引，不在事件迴圈上進行檔案操作。"""
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.create_task(self._save_later())
+
+    async def _save_later(self):
+        await asyncio.sleep(INDEX_SAVE_DELAY)
+        if not await self._write_index():
+            # 執行緒池忙碌時稍後再試
+            self._save_task = asyncio.create_task(self._save_later())
+
+    async def _write_index(self) -> bool:
+        # 在事件迴圈上序列化，避免執行緒讀取時索引同時被修改
+        payload = json.dumps({"entries": self.entries, "play_counts": self.play_counts})
+        index_path = os.path.join(self.directory, INDEX_FILENAME)
+        try:
+            await http_executor.run(_write_file, index_path, payload)
+            return True
+        except ExecutorBusy:
+            logger.warning("執行緒池忙碌，延後寫入音訊快取索引")
+            return False
+
+
+def _write_file(path: str, payload: str):
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.error(f"寫入音訊快取索引失敗: {e}")
+
+
+audio_cache = AudioCache(
+    directory=CACHE_DIR,
+    max_bytes=CACHE_MAX_BYTES,
+    min_plays=CACHE_MIN_PLAYS,
+    eviction=CACHE_EVICTION,
+)
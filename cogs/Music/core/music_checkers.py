@@ -1,23 +1,19 @@
 import logging
-import os
 
 from discord import app_commands
 from discord import Interaction as Itat
 from discord import VoiceClient as VC
-from pymongo import MongoClient
 
+from executors import db_executor
 from .music_data import voice_data
-from mongo_crud import MongoCRUD
+from mongo_crud import MongoCRUD, get_client
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("Music_Checkers")
 
 
-mongo_uri = os.getenv("MONGO_URI")
-mongo_client = MongoClient(mongo_uri, serverSelectionTimeoutMS=15000)
-
 db_handler = MongoCRUD(
-    client=mongo_client,
+    client=get_client,
     db_name="Norvireon_bot_db",
     collection_name="Music_data",
     logger=logger,
@@ -59,9 +55,9 @@ class Checkers:
         return app_commands.check(predicate)
 
     @staticmethod
-    def _is_dj(itat: Itat) -> bool:
+    async def _is_dj(itat: Itat) -> bool:
         guild_id = itat.guild_id
-        settings = db_handler.get(query={"_id": guild_id})[0]
+        settings = (await db_executor.run(db_handler.get, query={"_id": guild_id}))[0]
         dj_role_id = settings.get("dj_role_id", None)
 
         if itat.user.guild_permissions.administrator:
@@ -1,5 +1,6 @@
 import asyncio
 import discord
+import functools
 import logging
 import time
 import os
@@ -7,93 +8,178 @@ import os
 from discord.ui import View
 from discord import Interaction as Itat
 from discord import VoiceClient as VC
-from pymongo import MongoClient
 
-from mongo_crud import MongoCRUD
+from executors import (
+    BUSY_MESSAGE,
+    ExecutorBusy,
+    db_executor,
+    extract_executor,
+    http_executor,
+)
+from mongo_crud import MongoCRUD, get_client
+from . import music_player
 from . import music_utils
+from ..monster_siren import Monster_siren
 from ..youtube import Youtube
+from .music_actor import CANCELLED, music_actors
 from .music_data import voice_data
+from .music_idle import idle_pool
+from .music_presence import MusicVoiceClient, empty_channel_watcher
+from .music_scheduler import ffmpeg_scheduler
+from .music_ticker import ui_ticker
 from .view.control_views import ControlView
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("Music_Function")
 
-ffmpeg_options = {
-    "before_options": "-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5",
-    "options": '-vn -filter:a "volume=0.3"',
-}
-
-mongo_uri = os.getenv("MONGO_URI")
-mongo_client = MongoClient(mongo_uri, serverSelectionTimeoutMS=15000)
-
 db_handler = MongoCRUD(
-    client=mongo_client,
+    client=get_client,
     db_name="Norvireon_bot_db",
     collection_name="Music_data",
     logger=logger,
 )
 
+# 搜尋選單顯示時，每位使用者最多同時預先解析的結果數
+SPECULATIVE_BUDGET = int(os.getenv("MUSIC_SPECULATIVE_BUDGET", "3"))
+
+speculative_tasks: dict[int, set[asyncio.Task]] = {}
+
+# 播放列表同時解析的曲目數，以及進度訊息兩次編輯的最短間隔 (秒)
+PLAYLIST_CONCURRENCY = int(os.getenv("MUSIC_PLAYLIST_CONCURRENCY", "4"))
+PLAYLIST_SUMMARY_INTERVAL = 2.0
+PLAYLIST_SUMMARY_LINES = 10
+CANCELLED_MESSAGE = "操作已被停止指令取消"
+
+# 伺服器 ID -> 執行過的停止次數，停止前開始的播放列表據此判斷是否仍有效
+stop_generations: dict[int, int] = {}
+# 伺服器 ID -> 解析中的播放列表曲目，停止時一併取消
+playlist_tasks: dict[int, set[asyncio.Task]] = {}
+
 
 class Functions:
+    async def request(guild_id, op: str, **kwargs):
+        """
+        將音樂操作送入伺服器的指令信箱並等待完成。
+
+        同一伺服器的操作依序執行，不同伺服器之間平行處理。
+        """
+        return await music_actors.submit(guild_id, op, **kwargs)
+
+    async def request_from(itat: Itat, op: str, **kwargs):
+        """送出使用者觸發的操作，操作在執行前被停止取代時告知使用者。"""
+        result = await Functions.request(itat.guild_id, op, **kwargs)
+        if result is CANCELLED:
+            await itat.followup.send(CANCELLED_MESSAGE, ephemeral=True)
+        return result
+
     async def _pause(guild_id):
         try:
             client: VC = voice_data[guild_id].get("client")
-            data = db_handler.get(query={"_id": guild_id})[0]
+            data = (await db_executor.run(db_handler.get, query={"_id": guild_id}))[0]
             music_channel: discord.TextChannel = voice_data[guild_id]["music_channel"]
             if client and data.get("is_playing"):
                 client.pause()
-                db_handler.update_many(
+                await db_executor.run(
+                    db_handler.update_many,
                     query={"_id": guild_id},
                     new_values={"is_playing": False, "pause_time": time.time()},
                 )
+                ui_ticker.poke(guild_id)
                 await music_channel.send("音樂已暫停", delete_after=5)
         except Exception as e:
             logger.error(f"pause command error: {e}")
 
-    async def _play(guild_id):
+    async def _play(guild_id, song_data: dict = None, offset: float = 0) -> bool:
+        """
+        播放佇列中的下一首歌，回傳是否成功開始播放。
+
+        :param song_data: 指定要播放的曲目 (跳轉或恢復播放時使用)，未指定時從佇列取出。
+        :param offset: 從第幾秒開始播放。
+        """
         try:
             loop = asyncio.get_event_loop()
             music_channel: discord.TextChannel = voice_data[guild_id]["music_channel"]
+            # 每次播放都有新的代號，被跳轉或恢復取代的舊播放結束時不會接著播下一首
+            play_token = voice_data[guild_id].get("play_token", 0) + 1
+            voice_data[guild_id]["play_token"] = play_token
 
             def after_play(error):
                 if error:
                     logger.info(f"Player error: {error}")
+                guild_data = voice_data.get(guild_id)
+                if guild_data is None or guild_data.get("play_token") != play_token:
+                    return
                 future = asyncio.run_coroutine_threadsafe(
-                    Functions.play_next(guild_id), loop
+                    Functions.request(guild_id, "play_next"), loop
                 )
-                try:
-                    future.result()
-                except Exception as e:
-                    logger.error(f"Error in after_play callback: {e}")
+                # 不在播放執行緒等待結果：播放器要等此回呼返回才會結束舊的 FFmpeg 行程，
+                # 期間下一首會因為名額被舊行程佔用而等待
+                future.add_done_callback(report_error)
 
-            next_song_data = db_handler.pop(query={"_id": guild_id}, field="queue")
+            def report_error(future):
+                if not future.cancelled() and future.exception() is not None:
+                    logger.error(f"Error in after_play callback: {future.exception()}")
 
+            if song_data is None:
+                next_song_data = await db_executor.run(
+                    db_handler.pop, query={"_id": guild_id}, field="queue"
+                )
+            else:
+                next_song_data = song_data
+
+            idle_pool.resume(guild_id)
             if (
                 "client" not in voice_data[guild_id]
                 or not voice_data[guild_id]["client"].is_connected()
             ):
-                itat: Itat = voice_data[guild_id]["itat"]
-                voice_client: VC = await itat.user.voice.channel.connect()
+                voice_channel = voice_data[guild_id].get("voice_channel")
+                if voice_channel is None:
+                    itat: Itat = voice_data[guild_id]["itat"]
+                    voice_channel = itat.user.voice.channel
+                # 重新連線或重新載入後，伺服器上可能仍留有語音連線，
+                # 此時再次 connect 會引發 ClientException
+                voice_client = voice_channel.guild.voice_client
+                if voice_client is not None and voice_client.is_connected():
+                    if voice_client.channel != voice_channel:
+                        await voice_client.move_to(voice_channel)
+                else:
+                    if voice_client is not None:
+                        await voice_client.disconnect(force=True)
+                    connect_started = time.monotonic()
+                    voice_client: VC = await voice_channel.connect(cls=MusicVoiceClient)
+                    idle_pool.record_connect(time.monotonic() - connect_started)
                 voice_data[guild_id]["client"] = voice_client
             else:
                 voice_client = voice_data[guild_id]["client"]
+            voice_data[guild_id]["voice_channel"] = voice_client.channel
             await music_channel.send("正在載入...", delete_after=5)
 
-            player = discord.FFmpegOpusAudio(
-                next_song_data["song_url"], **ffmpeg_options
+            # 先停止目前的播放，讓舊的 FFmpeg 行程在取得新名額前釋放名額
+            if voice_client.is_playing() or voice_client.is_paused():
+                voice_client.stop()
+            player = await music_player.create_source(
+                next_song_data, guild_id, offset=offset
             )
-            voice_client.play(player, after=after_play)
-
-            db_handler.update_one(
+            try:
+                voice_client.play(player, after=after_play)
+            except Exception:
+                # play 失敗時不會清理音源，需自行釋放 FFmpeg 名額
+                player.cleanup()
+                raise
+
+            await db_executor.run(
+                db_handler.update_one,
                 query={"_id": guild_id},
                 new_values={
-                    "start_time": time.time(),
+                    "start_time": time.time() - offset,
                     "duration": next_song_data["duration"],
                     "song_url": next_song_data["song_url"],
                     "pause_time": None,
                     "total_paused_duration": None,
                     "is_playing": True,
+                    "voice_channel_id": voice_client.channel.id,
+                    "text_channel_id": music_channel.id,
                 },
                 upsert=True,
             )
@@ -102,54 +188,95 @@ class Functions:
                 title=next_song_data["title"], description="播放中...", color=0xADC8FF
             )
             embed.set_thumbnail(url=next_song_data.get("thumbnail", ""))
-            control_view = ControlView(guild_id)
+            control_view = ControlView.render(is_paused=False)
             embed_msg = await music_channel.send(view=control_view, embed=embed)
             voice_data[guild_id]["state_embed_message"] = embed_msg
 
-            db_handler.update_one(
+            await db_executor.run(
+                db_handler.update_one,
                 query={"_id": guild_id},
                 new_values={"current_playing": next_song_data},
                 upsert=True,
             )
 
-            voice_data[guild_id]["progress_task"] = asyncio.create_task(
-                Functions.playback_state_updater(guild_id)
-            )
+            ui_ticker.register(guild_id)
+            return True
         except Exception as e:
             await voice_data[guild_id]["music_channel"].send(
                 "無法播放，請使用連結或再試一次", delete_after=10
             )
             logger.error(f"_play error: {e}")
+            return False
+
+    async def _recover(guild_id):
+        """
+        從資料庫記錄的位置恢復目前曲目的播放，回傳是否成功恢復。
+
+        必須在伺服器的指令信箱中執行，外部請以 `request(guild_id, "recover")` 呼叫。
+        """
+        data = (await db_executor.run(db_handler.get, query={"_id": guild_id}))[0]
+        song_data = data.get("current_playing")
+        if not song_data:
+            return False
+        position = music_utils.get_elapsed(data)
+        duration = song_data.get("duration") or 0
+        if duration and position >= duration:
+            return False
+
+        # 串流網址可能已過期，從原始頁面重新解析
+        if song_data.get("webpage_url"):
+            fresh_data = await Functions.resolve(song_data["webpage_url"])
+            if fresh_data:
+                song_data = {**song_data, **fresh_data}
+
+        voice_data[guild_id].pop("client", None)
+        logger.info(f"Recovering guild {guild_id} at {position:.0f}s")
+        return await Functions._play(guild_id, song_data=song_data, offset=position)
 
     async def _resume(guild_id):
         try:
             client: VC = voice_data[guild_id].get("client")
-            data = db_handler.get(query={"_id": guild_id})[0]
+            data = (await db_executor.run(db_handler.get, query={"_id": guild_id}))[0]
             music_channel: discord.TextChannel = voice_data[guild_id]["music_channel"]
-            if client and not data.get("is_playing"):
+            if (
+                client
+                and not data.get("is_playing")
+                and data.get("current_playing")
+            ):
                 client.resume()
                 paused_for = time.time() - data["pause_time"]
                 paused_time = data.get("total_paused_duration")
                 if paused_time is None:
                     paused_time = 0
-                db_handler.update_many(
+                await db_executor.run(
+                    db_handler.update_many,
                     query={"_id": guild_id},
                     new_values={
                         "total_paused_duration": paused_for + paused_time,
                         "is_playing": True,
                     },
                 )
+                ui_ticker.poke(guild_id)
                 await music_channel.send("音樂已恢復播放", delete_after=5)
         except Exception as e:
             logger.error(f"resume command error: {e}")
 
-    async def _skip(guild_id):
+    async def _skip(guild_id, count: int = 1):
         try:
             client: VC = voice_data[guild_id].get("client")
-            data = db_handler.get(query={"_id": guild_id})[0]
+            data = (await db_executor.run(db_handler.get, query={"_id": guild_id}))[0]
             music_channel = voice_data[guild_id].get("music_channel")
             if client and data.get("is_playing"):
+                # 連續多次跳過時，先移除佇列前面的歌曲
+                for _ in range(count - 1):
+                    removed = await db_executor.run(
+                        db_handler.pop, query={"_id": guild_id}, field="queue"
+                    )
+                    if removed is None:
+                        break
                 client.stop()
+                if count > 1:
+                    await music_channel.send(f"已跳過 {count} 首", delete_after=5)
             else:
                 await music_channel.send("沒有正在播放的音樂", delete_after=5)
         except Exception as e:
@@ -157,52 +284,152 @@ class Functions:
             await Functions._stop(guild_id)
             logger.error(f"skip command error: {e}")
 
-    async def _stop(guild_id):
-        if guild_id not in voice_data:
+    async def _toggle(guild_id, count: int = 1):
+        """切換暫停狀態，連續切換偶數次等於不變。"""
+        if count % 2 == 0:
             return
+        data = await db_executor.run(db_handler.get, query={"_id": guild_id})
+        if data and data[0].get("is_playing"):
+            await Functions._pause(guild_id)
+        else:
+            await Functions._resume(guild_id)
+
+    async def _start(guild_id):
+        """沒有正在播放時開始播放佇列，回傳是否開始播放。"""
+        client: VC = voice_data[guild_id].get("client")
+        if client is None or not client.is_connected() or idle_pool.is_idle(guild_id):
+            await Functions._play(guild_id)
+            return True
+        return False
+
+    async def _seek(guild_id, position: float):
+        try:
+            client: VC = voice_data[guild_id].get("client")
+            data = (await db_executor.run(db_handler.get, query={"_id": guild_id}))[0]
+            music_channel = voice_data[guild_id]["music_channel"]
+            song_data = data.get("current_playing")
+            if not client or not song_data:
+                await music_channel.send("沒有正在播放的音樂", delete_after=5)
+                return
+            duration = song_data.get("duration") or 0
+            if duration and position >= duration:
+                await music_channel.send("指定的時間超過曲目長度", delete_after=5)
+                return
+
+            embed_msg: discord.Message = voice_data[guild_id].get(
+                "state_embed_message"
+            )
+            if embed_msg:
+                try:
+                    await embed_msg.delete()
+                except discord.HTTPException:
+                    pass
+            await Functions._play(guild_id, song_data=song_data, offset=position)
+            await music_channel.send(
+                f"已跳轉至 {music_utils.format_time(position)}", delete_after=5
+            )
+        except Exception as e:
+            logger.error(f"seek command error: {e}")
+
+    async def _enqueue(guild_id, data: dict, generation: int, start: bool = False):
+        """
+        將播放列表的曲目加入佇列。
+
+        :param generation: 播放列表開始時的停止次數，之後執行過停止時不加入佇列。
+        :param start: 沒有正在播放時是否開始播放。
+        :return: 是否由此曲目開始播放；播放列表已被停止時回傳 `CANCELLED`。
+        """
+        if stop_generations.get(guild_id, 0) != generation:
+            return CANCELLED
+        await db_executor.run(
+            db_handler.append, query={"_id": guild_id}, field="queue", value=data
+        )
+        return await Functions._start(guild_id) if start else False
+
+    async def _stop(guild_id):
+        # 停止前開始解析的播放列表曲目不再加入佇列
+        stop_generations[guild_id] = stop_generations.get(guild_id, 0) + 1
+        for task in playlist_tasks.pop(guild_id, ()):
+            task.cancel()
 
-        if "progress_task" not in voice_data[guild_id]:
+        if guild_id not in voice_data:
             return
 
         if "client" not in voice_data[guild_id]:
             return
 
-        voice_data[guild_id]["progress_task"].cancel()
+        ui_ticker.unregister(guild_id)
+        empty_channel_watcher.cancel(guild_id)
+        idle_pool.discard(guild_id)
         client: VC = voice_data[guild_id]["client"]
 
+        # 連線已被外部中斷時也要清除狀態，重新啟動後才不會恢復播放
+        clear = functools.partial(
+            db_handler.update_one,
+            query={"_id": guild_id},
+            new_values={"queue": [], "is_playing": False, "current_playing": None},
+            upsert=True,
+        )
+        try:
+            await db_executor.run(clear)
+        except ExecutorBusy:
+            # 停止必須完成，執行緒池忙碌時直接寫入
+            clear()
         if client.is_connected():
-            MongoCRUD.update_one(
-                db_handler,
-                query={"_id": guild_id},
-                new_values={"queue": [], "is_playing": False, "current_playing": None},
-                upsert=True,
-            )
             await client.disconnect(force=True)
+        ffmpeg_scheduler.reap(guild_id)
         await asyncio.sleep(1)
         if guild_id in voice_data:
             await voice_data[guild_id]["music_channel"].send("已停止並斷開連接")
             del voice_data[guild_id]
 
+    async def _idle(guild_id):
+        """佇列播完後保留語音連線，保留期限過後才斷線。"""
+        ui_ticker.unregister(guild_id)
+        await db_executor.run(
+            db_handler.update_one,
+            query={"_id": guild_id},
+            new_values={"is_playing": False, "current_playing": None},
+            upsert=True,
+        )
+        idle_pool.park(guild_id)
+        await voice_data[guild_id]["music_channel"].send(
+            f"佇列已播放完畢，{idle_pool.linger_seconds:.0f} 秒內沒有新歌曲將斷開連接",
+            delete_after=idle_pool.linger_seconds,
+        )
+
     async def play_next(guild_id):
+        if guild_id not in voice_data:
+            return
         try:
-            data = db_handler.get(query={"_id": guild_id})[0]
+            data = (await db_executor.run(db_handler.get, query={"_id": guild_id}))[0]
             embed_msg: discord.Message = voice_data[guild_id]["state_embed_message"]
             embed = embed_msg.embeds.pop()
             embed.description = "播放完畢"
             await embed_msg.edit(embed=embed, view=None)
-            if (
-                db_handler.get(query={"_id": guild_id})[0].get("current_playing")
-                is None
-            ):
+            documents = await db_executor.run(db_handler.get, query={"_id": guild_id})
+            if documents[0].get("current_playing") is None:
                 return
+            client: VC = voice_data[guild_id].get("client")
+            if client is not None and not client.is_connected():
+                if getattr(client, "disconnected_externally", False):
+                    # 被管理員中斷連線時視同停止，不重新加入頻道
+                    await Functions._stop(guild_id)
+                    return
+                # discord.py 重新連線失敗而非播放完畢，從中斷的位置恢復
+                if await Functions._recover(guild_id):
+                    return
             queue = data.get("queue", None)
-            db_handler.append(
+            await db_executor.run(
+                db_handler.append,
                 query={"_id": guild_id},
                 field="played",
                 value=data.get("current_playing"),
             )
             if len(queue) > 0:
                 await Functions._play(guild_id)
+            elif idle_pool.enabled:
+                await Functions._idle(guild_id)
             else:
                 await Functions._stop(guild_id)
         except Exception as e:
@@ -212,6 +439,167 @@ class Functions:
                 "播放下一首時出現問題", delete_after=10
             )
 
+    async def resolve(request: str):
+        """依網址來源解析曲目資料，無法辨識來源時回傳 None。"""
+        match music_utils.get_source_name(request):
+            case "youtube":
+                return await Youtube.get_data_from_single(request)
+            case "monster_siren":
+                return await http_executor.run(Monster_siren.get_song_data, request)
+        return None
+
+    def _speculate(user_id: int, urls: list[str]) -> dict[str, asyncio.Task]:
+        """
+        在使用者選擇前預先解析排名最前的搜尋結果。
+
+        同一使用者進行中的預先解析數量不超過 `SPECULATIVE_BUDGET`，
+        使用者選擇後即可直接從快取取得結果。
+
+        預先解析不會被取消：取消只會結束等待的協程，yt-dlp 仍會佔用執行緒直到解析完成，
+        因此讓它完成並寫入快取，之後再搜尋相同結果時可以直接使用。
+        """
+        # 解析執行緒池有任何工作時都不預先解析，避免與實際播放請求爭用執行緒
+        if not extract_executor.is_idle():
+            return {}
+        active = speculative_tasks.setdefault(user_id, set())
+        started = {}
+        for url in urls:
+            # 工作要等協程開始執行才會送入執行緒池，這裡以數量保留至少一個執行緒給實際播放請求
+            if (
+                len(active) >= SPECULATIVE_BUDGET
+                or len(started) >= extract_executor.max_workers - 1
+            ):
+                break
+            if Youtube.get_cached(url) is not None:
+                continue
+            task = Youtube.resolve_in_background(url)
+            if task in active:
+                continue
+            active.add(task)
+            task.add_done_callback(lambda t: Functions._release_speculation(user_id, t))
+            started[url] = task
+        if not active:
+            speculative_tasks.pop(user_id, None)
+        return started
+
+    def _release_speculation(user_id: int, task: asyncio.Task):
+        if not task.cancelled():
+            # 預先解析失敗不影響使用者，選擇後會重新解析
+            task.exception()
+        active = speculative_tasks.get(user_id)
+        if active is None:
+            return
+        active.discard(task)
+        if not active:
+            del speculative_tasks[user_id]
+
+    async def enqueue_playlist(itat: Itat, urls: list[str]) -> bool:
+        """
+        平行解析播放列表並依完成順序加入佇列。
+
+        第一首解析完成即開始播放，其餘曲目在背景陸續加入；
+        進度只用一則摘要訊息顯示，並限制編輯頻率。
+
+        :return: 是否由此播放列表開始播放；加入完成前被停止時回傳 `CANCELLED`，
+            尚未解析的曲目會被取消，之後解析完成的曲目也不再加入佇列。
+        """
+        guild_id = itat.guild_id
+        user = itat.user.nick if itat.user.nick else itat.user.name
+        progress = {"total": len(urls), "added": [], "failed": 0, "done": False}
+        semaphore = asyncio.Semaphore(PLAYLIST_CONCURRENCY)
+        changed = asyncio.Event()
+        generation = stop_generations.get(guild_id, 0)
+        started = False
+        start_requested = False
+
+        summary_message = await itat.channel.send(
+            embed=Functions._playlist_embed(progress, user)
+        )
+
+        async def resolve(url):
+            nonlocal started, start_requested
+            async with semaphore:
+                try:
+                    data = await Youtube.get_data_from_single(url)
+                except Exception as e:
+                    logger.error(f"Error adding song from playlist: {e}")
+                    progress["failed"] += 1
+                    changed.set()
+                    return
+            # 經由信箱加入佇列，與停止依序執行，停止清空佇列後不會再被加回
+            start = not start_requested
+            start_requested = True
+            result = await Functions.request(
+                guild_id, "enqueue", data=data, generation=generation, start=start
+            )
+            if result is CANCELLED:
+                started = CANCELLED
+                return
+            if start:
+                started = result
+            progress["added"].append(data)
+            changed.set()
+
+        async def notify():
+            while True:
+                await changed.wait()
+                changed.clear()
+                try:
+                    await summary_message.edit(
+                        embed=Functions._playlist_embed(progress, user)
+                    )
+                except discord.HTTPException as e:
+                    logger.warning(f"Failed to update playlist summary: {e}")
+                await asyncio.sleep(PLAYLIST_SUMMARY_INTERVAL)
+
+        notifier = asyncio.create_task(notify())
+        tasks = {asyncio.create_task(resolve(url)) for url in urls}
+        playlist_tasks.setdefault(guild_id, set()).update(tasks)
+        try:
+            # 停止時會取消尚未完成的曲目，不視為錯誤
+            for result in await asyncio.gather(*tasks, return_exceptions=True):
+                if isinstance(result, Exception):
+                    raise result
+        finally:
+            notifier.cancel()
+            active = playlist_tasks.get(guild_id)
+            if active is not None:
+                active.difference_update(tasks)
+                if not active:
+                    del playlist_tasks[guild_id]
+            progress["done"] = True
+            try:
+                await summary_message.edit(
+                    embed=Functions._playlist_embed(progress, user)
+                )
+            except discord.HTTPException as e:
+                logger.warning(f"Failed to update playlist summary: {e}")
+        if stop_generations.get(guild_id, 0) != generation:
+            return CANCELLED
+        return started
+
+    def _playlist_embed(progress: dict, user: str) -> discord.Embed:
+        added = progress["added"]
+        status = "已加入佇列" if progress["done"] else "正在加入佇列"
+        embed = discord.Embed(
+            color=0x28FF28,
+            title=f"{status}: {len(added)}/{progress['total']} 首",
+        )
+        lines = [
+            f"{music_utils.format_time(data.get('duration', 0))} "
+            f"{data.get('title', 'Unknown Title')}"
+            for data in added[:PLAYLIST_SUMMARY_LINES]
+        ]
+        if len(added) > PLAYLIST_SUMMARY_LINES:
+            lines.append(f"...以及其他 {len(added) - PLAYLIST_SUMMARY_LINES} 首")
+        embed.description = "\n".join(lines) or "解析中..."
+        if progress["failed"]:
+            embed.add_field(name="失敗", value=f"{progress['failed']} 首無法加入")
+        embed.add_field(name="\u200b", value=f"由{user}加入")
+        if added:
+            embed.set_thumbnail(url=added[0].get("thumbnail", ""))
+        return embed
+
     async def search(itat: Itat, request, region="youtube"):
         try:
             await itat.followup.send(f"正在搜尋: `{request}`...", ephemeral=True)
@@ -259,74 +647,51 @@ class Functions:
 
                     match region:
                         case "youtube":
-                            song_data = await Youtube.get_data(song_url)
+                            song_data = await Youtube.get_data_from_single(song_url)
                     if not future.done():
                         future.set_result(song_data)
 
+                except ExecutorBusy:
+                    await original_message.edit(content=BUSY_MESSAGE, view=None)
+                    if not future.done():
+                        future.set_result(None)
                 except Exception as e:
                     logger.error(f"search_callback error: {e}")
+                    if not future.done():
+                        future.set_result(None)
 
             search_menu.callback = search_menu_callback
 
             original_message = await itat.followup.send(
                 content="請從下方選擇一個結果", view=view, ephemeral=True
             )
+            if region == "youtube":
+                Functions._speculate(itat.user.id, [url for url, _, _ in results])
             selected_song_data = await future
             return selected_song_data
 
+        except ExecutorBusy:
+            await itat.followup.send(BUSY_MESSAGE, ephemeral=True)
         except Exception as e:
             logger.error(f"search error: {e}")
             await itat.followup.send(
                 "搜尋時發生錯誤，請使用有效連結或再試一次。", ephemeral=True
             )
 
-    async def playback_state_updater(guild_id):
-        try:
-            while guild_id in voice_data:
-                if "client" not in voice_data[guild_id]:
-                    break
-
-                client: VC = voice_data[guild_id]["client"]
-                human_members = [
-                    member for member in client.channel.members if not member.bot
-                ]
-
-                if len(human_members) == 0:
-                    logger.info(
-                        f"No users left in voice channel for guild {guild_id}. Stopping playback."
-                    )
-                    await Functions._stop(guild_id)
-                    break
-
-                embed_msg: discord.Message = voice_data[guild_id].get(
-                    "state_embed_message"
-                )
 
-                if embed_msg:
-                    if len(embed_msg.embeds) == 0:
-                        logger.warning(
-                            f"Embed message has no embeds for guild {guild_id}."
-                        )
-                        break
-                    embed = embed_msg.embeds[0]
-                    new_progress_bar = music_utils.generate_progress_bar(guild_id)
-                    if embed.description != new_progress_bar:
-                        embed.description = new_progress_bar
-                        control_view = ControlView(guild_id)
-                        try:
-                            await embed_msg.edit(embed=embed, view=control_view)
-                        except discord.NotFound:
-                            break
-
-                await asyncio.sleep(1)
-
-                guild_data = voice_data.get(guild_id)
-                if guild_data:
-                    embed_msg = guild_data.get("embed_msg")
-                    if embed_msg:
-                        embed = embed_msg.embeds[0]
-                        embed.description = "播放完畢"
-                        await embed_msg.edit(embed=embed, view=None)
-
-        except Exception as e:
-            logger.error(f"update_progress_bar encountered a fatal error: {e}")
+for op, handler in {
+    "start": Functions._start,
+    "enqueue": Functions._enqueue,
+    "play_next": Functions.play_next,
+    "pause": Functions._pause,
+    "resume": Functions._resume,
+    "toggle": Functions._toggle,
+    "skip": Functions._skip,
+    "seek": Functions._seek,
+    "stop": Functions._stop,
+    "recover": Functions._recover,
+}.items():
+    music_actors.register_handler(op, handler)
+
+empty_channel_watcher.on_empty = lambda guild_id: Functions.request(guild_id, "stop")
+idle_pool.on_expire = lambda guild_id: Functions.request(guild_id, "stop")
@@ -0,0 +1,109 @@
+import asyncio
+import collections
+import logging
+import os
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("Music_Idle")
+
+# 佇列播完後保留語音連線的秒數，設為 0 則立即斷線
+IDLE_LINGER_SECONDS = float(os.getenv("MUSIC_IDLE_LINGER_SECONDS", "120"))
+# 全域最多保留的閒置連線數，超過時斷開最久未使用的連線
+MAX_IDLE_CONNECTIONS = int(os.getenv("MUSIC_MAX_IDLE_CONNECTIONS", "20"))
+
+
+class IdlePool:
+    """
+    佇列播完後暫時保留的閒置語音連線。
+
+    在保留期限內再次播放時可直接沿用連線，省去重新建立語音連線的時間。
+    """
+
+    def __init__(self, linger_seconds: float, max_idle: int, on_expire=None):
+        self.linger_seconds = linger_seconds
+        self.max_idle = max_idle
+        self.on_expire = on_expire
+        self.stats = {
+            "parked": 0,
+            "reused": 0,
+            "expired": 0,
+            "evicted": 0,
+            "connects": 0,
+            "connect_seconds_total": 0.0,
+        }
+        self._idle: collections.OrderedDict[int, asyncio.Task] = (
+            collections.OrderedDict()
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.linger_seconds > 0 and self.max_idle > 0
+
+    def is_idle(self, guild_id: int) -> bool:
+        return guild_id in self._idle
+
+    def park(self, guild_id: int):
+        """將連線標記為閒置並開始計時，超過上限時淘汰最久的閒置連線。"""
+        self.discard(guild_id)
+        self._idle[guild_id] = asyncio.create_task(self._expire(guild_id))
+        self.stats["parked"] += 1
+        while len(self._idle) > self.max_idle:
+            oldest, task = self._idle.popitem(last=False)
+            task.cancel()
+            self.stats["evicted"] += 1
+            logger.info(f"閒置連線數超過上限，斷開最久未使用的連線: {oldest}")
+            if self.on_expire:
+                asyncio.create_task(self.on_expire(oldest))
+
+    def resume(self, guild_id: int) -> bool:
+        """取回閒置連線，回傳該伺服器是否原本處於閒置狀態。"""
+        task = self._idle.pop(guild_id, None)
+        if task is None:
+            return False
+        task.cancel()
+        self.stats["reused"] += 1
+        logger.info(
+            f"沿用閒置語音連線: {guild_id} "
+            f"(約省下 {self.average_connect_seconds():.2f} 秒連線時間)"
+        )
+        return True
+
+    def discard(self, guild_id: int):
+        task = self._idle.pop(guild_id, None)
+        if task is not None:
+            task.cancel()
+
+    def record_connect(self, seconds: float):
+        self.stats["connects"] += 1
+        self.stats["connect_seconds_total"] += seconds
+
+    def average_connect_seconds(self) -> float:
+        if self.stats["connects"] == 0:
+            return 0.0
+        return self.stats["connect_seconds_total"] / self.stats["connects"]
+
+    def summary(self) -> dict:
+        return {
+            "idle": len(self._idle),
+            "max_idle": self.max_idle,
+            "average_connect_seconds": self.average_connect_seconds(),
+            "saved_connect_seconds": self.stats["reused"]
+            * self.average_connect_seconds(),
+            **self.stats,
+        }
+
+    async def _expire(self, guild_id: int):
+        try:
+            await asyncio.sleep(self.linger_seconds)
+        except asyncio.CancelledError:
+            return
+        if self._idle.get(guild_id) is not asyncio.current_task():
+            return
+        del self._idle[guild_id]
+        self.stats["expired"] += 1
+        logger.info(f"閒置連線逾時，斷開連線: {guild_id}")
+        if self.on_expire:
+            await self.on_expire(guild_id)
+
+
+idle_pool = IdlePool(linger_seconds=IDLE_LINGER_SECONDS, max_idle=MAX_IDLE_CONNECTIONS)
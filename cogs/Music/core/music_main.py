@@ -2,36 +2,38 @@ import asyncio
 import discord
 import logging
 import random
-import os
 
 from discord import app_commands
 from discord import Interaction as Itat
 from discord import VoiceClient as VC
 from discord.ext import commands
-from pymongo import MongoClient
 
-from mongo_crud import MongoCRUD
+from executors import BUSY_MESSAGE, ExecutorBusy, db_executor
+from mongo_crud import MongoCRUD, get_client
+from . import music_player
 from . import music_utils
+from .music_buffer import get_buffer_health
+from .music_cache import audio_cache
+from .music_actor import CANCELLED, music_actors
 from .music_checkers import Checkers
 from .music_data import voice_data
 from .music_functions import Functions
-from ..monster_siren import Monster_siren
+from .music_idle import idle_pool
+from .music_presence import empty_channel_watcher
+from .music_scheduler import ffmpeg_scheduler
+from .music_ticker import ui_ticker
+from .view.control_views import ControlView
 from ..youtube import Youtube
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("Music_Main")
 
-ffmpeg_options = {
-    "before_options": "-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5",
-    "options": '-vn -filter:a "volume=0.3"',
-}
-
-mongo_uri = os.getenv("MONGO_URI")
-mongo_client = MongoClient(mongo_uri, serverSelectionTimeoutMS=15000)
+# 狀態指令最多列出的 FFmpeg 行程數，避免超過嵌入欄位的長度限制
+STATS_MAX_PROCESSES = 8
 
 db_handler = MongoCRUD(
-    client=mongo_client,
+    client=get_client,
     db_name="Norvireon_bot_db",
     collection_name="Music_data",
     logger=logger,
@@ -41,8 +43,75 @@ db_handler = MongoCRUD(
 class Music(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        self.recovery_task: asyncio.Task | None = None
         logger.info("Music Cog initialized with DB handler.")
 
+    async def cog_load(self):
+        self.bot.add_view(ControlView())
+        self.recovery_task = asyncio.create_task(self.recover_sessions())
+
+    async def cog_unload(self):
+        if self.recovery_task is not None:
+            self.recovery_task.cancel()
+        await audio_cache.flush()
+
+    async def recover_sessions(self):
+        """重新啟動後，恢復先前仍在播放的伺服器。"""
+        await self.bot.wait_until_ready()
+        for data in await db_executor.run(db_handler.get, query={"is_playing": True}):
+            guild_id = data["_id"]
+            try:
+                guild = self.bot.get_guild(guild_id)
+                if guild is None or guild_id in voice_data:
+                    continue
+                voice_channel = guild.get_channel(data.get("voice_channel_id"))
+                music_channel = guild.get_channel(data.get("text_channel_id"))
+                if voice_channel is None or music_channel is None:
+                    await db_executor.run(
+                        music_utils.return_to_default_music_settings, guild_id
+                    )
+                    continue
+                if not [member for member in voice_channel.members if not member.bot]:
+                    logger.info(f"No users in voice channel of guild {guild_id}.")
+                    await db_executor.run(
+                        music_utils.return_to_default_music_settings, guild_id
+                    )
+                    continue
+
+                voice_data[guild_id] = {
+                    "music_channel": music_channel,
+                    "voice_channel": voice_channel,
+                }
+                # 經由信箱執行，避免與同時送出的指令互相干擾
+                if await Functions.request(guild_id, "recover") is True:
+                    await music_channel.send(
+                        "機器人已重新啟動，已恢復播放", delete_after=10
+                    )
+                else:
+                    # 恢復失敗前可能已經連上語音頻道，需一併斷線
+                    await Functions.request(guild_id, "stop")
+                    voice_data.pop(guild_id, None)
+                    await db_executor.run(
+                        music_utils.return_to_default_music_settings, guild_id
+                    )
+            except Exception as e:
+                logger.error(f"Failed to recover guild {guild_id}: {e}")
+                voice_data.pop(guild_id, None)
+
+    @commands.Cog.listener()
+    async def on_voice_state_update(
+        self,
+        member: discord.Member,
+        before: discord.VoiceState,
+        after: discord.VoiceState,
+    ):
+        guild_id = member.guild.id
+        client: VC = voice_data.get(guild_id, {}).get("client")
+        channel = client.channel if client and client.is_connected() else None
+        empty_channel_watcher.handle_voice_state_update(
+            guild_id, channel, before, after
+        )
+
     @app_commands.command(name="play", description="播放音樂")
     @app_commands.describe(request="可使用網址或直接搜尋")
     @Checkers.is_in_valid_voice_channel()
@@ -63,7 +132,9 @@ class Music(commands.Cog):
 
             if guild_id not in voice_data:
                 voice_data[guild_id] = {}
-                music_utils.return_to_default_music_settings(guild_id)
+                await db_executor.run(
+                    music_utils.return_to_default_music_settings, guild_id
+                )
 
             elif "client" in voice_data[guild_id]:
                 voice_client: VC = voice_data[guild_id]["client"]
@@ -78,15 +149,12 @@ class Music(commands.Cog):
             voice_data[guild_id]["music_channel"] = itat.channel
             voice_data[guild_id]["itat"] = itat
 
-            match music_utils.get_source_name(request):
-                case "youtube":
-                    data = await Youtube.get_data_from_single(request)
-                case "monster_siren":
-                    data = Monster_siren.get_song_data(request)
-                case "":
-                    data = await Functions.search(itat, request)
-                    if data is None:
-                        return
+            if music_utils.get_source_name(request):
+                data = await Functions.resolve(request)
+            else:
+                data = await Functions.search(itat, request)
+                if data is None:
+                    return
 
             if data is None:
                 await itat.followup.send(
@@ -94,18 +162,23 @@ class Music(commands.Cog):
                 )
                 return
             else:
-                db_handler.append(query={"_id": guild_id}, field="queue", value=data)
+                await db_executor.run(
+                    db_handler.append,
+                    query={"_id": guild_id},
+                    field="queue",
+                    value=data,
+                )
 
             title = data.get("title", "Unknown Title")
             thumbnail = data.get("thumbnail", "")
             duration = data.get("duration", 0)
             author = data.get("author", "Unknown Artist")
 
-            if ("client" not in voice_data[guild_id]) or (
-                not voice_data[guild_id]["client"].is_connected()
-            ):
+            started = await Functions.request(guild_id, "start")
+            if started is CANCELLED:
+                await itat.followup.send("播放請求已被停止指令取消", ephemeral=True)
+            elif started:
                 await itat.followup.send("正在處理播放請求", ephemeral=True)
-                await Functions._play(guild_id)
 
             else:
                 embed = discord.Embed(
@@ -119,6 +192,8 @@ class Music(commands.Cog):
                 embed.set_thumbnail(url=thumbnail)
                 await itat.channel.send(embed=embed)
 
+        except ExecutorBusy:
+            await itat.followup.send(BUSY_MESSAGE, ephemeral=True)
         except Exception as e:
             logger.error(f"Command_play Error {e}")
             await itat.followup.send("執行指令時發生錯誤，請稍後再試。", ephemeral=True)
@@ -146,7 +221,9 @@ class Music(commands.Cog):
 
             if guild_id not in voice_data:
                 voice_data[guild_id] = {}
-                music_utils.return_to_default_music_settings(guild_id)
+                await db_executor.run(
+                    music_utils.return_to_default_music_settings, guild_id
+                )
 
             elif "client" in voice_data[guild_id]:
                 voice_client: VC = voice_data[guild_id]["client"]
@@ -171,43 +248,16 @@ class Music(commands.Cog):
                 metadatas,
                 min(max_results, len(metadatas), 25),  # 確保不超過總數或 25
             )
-            user = itat.user.nick if itat.user.nick else itat.user.name
-            for song in selected_songs:
-                try:
-                    data = await Youtube.get_data_from_single(song["webpage_url"])
-                    db_handler.append(
-                        query={"_id": guild_id}, field="queue", value=data
-                    )
-                    title = data.get("title", "Unknown Title")
-                    thumbnail = data.get("thumbnail", "")
-                    duration = data.get("duration", 0)
-                    author = data.get("author", "Unknown Artist")
-
-                    embed = discord.Embed(
-                        color=0x28FF28,
-                        title=f"加入佇列:\n{title}",
-                        description=f"by {author}",
-                    )
-                    embed.add_field(
-                        name="時長", value=music_utils.format_time(duration)
-                    )
-                    embed.add_field(name="\u200b", value=f"由{user}加入")
-                    embed.set_thumbnail(url=thumbnail)
-                    await itat.channel.send(embed=embed)
-                    await asyncio.sleep(1)
-                except Exception as e:
-                    itat.channel.send(
-                        "加入播放列表時發生錯誤，部分歌曲可能未加入佇列。"
-                    )
-                    logger.error(f"Error adding song from playlist: {e}")
-                    continue
-
-            if ("client" not in voice_data[guild_id]) or (
-                not voice_data[guild_id]["client"].is_connected()
-            ):
+            started = await Functions.enqueue_playlist(
+                itat, [song["webpage_url"] for song in selected_songs]
+            )
+            if started is CANCELLED:
+                await itat.followup.send("播放列表已被停止指令取消", ephemeral=True)
+            elif started:
                 await itat.followup.send("正在處理播放請求", ephemeral=True)
-                await Functions._play(guild_id)
 
+        except ExecutorBusy:
+            await itat.followup.send(BUSY_MESSAGE, ephemeral=True)
         except Exception as e:
             logger.error(f"Command_play_playlist Error {e}")
             await itat.followup.send("執行指令時發生錯誤，請稍後再試。", ephemeral=True)
@@ -217,29 +267,116 @@ class Music(commands.Cog):
     @Checkers.is_in_valid_voice_channel()
     async def command_stop(self, itat: Itat):
         await itat.response.send_message("處理中", ephemeral=True, delete_after=5)
-        guild_id = itat.guild_id
-        await Functions._stop(guild_id)
+        await Functions.request_from(itat, "stop")
 
     @app_commands.command(name="skip", description="跳過當前曲目")
     @Checkers.is_dj()
     @Checkers.is_in_valid_voice_channel()
     async def command_skip(self, itat: Itat):
         await itat.response.send_message("處理中", ephemeral=True, delete_after=5)
-        guild_id = itat.guild_id
-        await Functions._skip(guild_id)
+        await Functions.request_from(itat, "skip")
+
+    @app_commands.command(name="seek", description="跳轉到指定時間")
+    @app_commands.describe(position="例如 1:30 或 90 (秒)")
+    @Checkers.is_dj()
+    @Checkers.is_in_valid_voice_channel()
+    async def command_seek(self, itat: Itat, position: str):
+        seconds = music_utils.parse_time(position)
+        if seconds is None:
+            await itat.response.send_message(
+                "時間格式錯誤，請使用 1:30 或 90 的格式", ephemeral=True, delete_after=5
+            )
+            return
+        await itat.response.send_message("處理中", ephemeral=True, delete_after=5)
+        await Functions.request_from(itat, "seek", position=seconds)
 
     @app_commands.command(name="pause", description="暫停音樂")
     @Checkers.is_dj()
     @Checkers.is_in_valid_voice_channel()
     async def command_pause(self, itat: Itat):
         await itat.response.send_message("處理中", ephemeral=True, delete_after=5)
-        guild_id = itat.guild_id
-        await Functions._pause(guild_id)
+        await Functions.request_from(itat, "pause")
 
     @app_commands.command(name="resume", description="繼續播放")
     @Checkers.is_dj()
     @Checkers.is_in_valid_voice_channel()
     async def command_resume(self, itat: Itat):
         await itat.response.send_message("處理中", ephemeral=True, delete_after=5)
-        guild_id = itat.guild_id
-        await Functions._resume(guild_id)
+        await Functions.request_from(itat, "resume")
+
+    @app_commands.command(name="music_stats", description="顯示音樂播放的內部狀態")
+    async def command_music_stats(self, itat: Itat):
+        embed = discord.Embed(title="音樂播放狀態", color=0xADC8FF)
+        embed.add_field(name="FFmpeg", value=self.ffmpeg_stats(), inline=False)
+        embed.add_field(name="進度更新", value=self.ticker_stats(), inline=False)
+        embed.add_field(name="串流", value=self.stream_stats(), inline=False)
+        embed.add_field(name="連線與指令", value=self.session_stats(), inline=False)
+        await itat.response.send_message(embed=embed, ephemeral=True)
+
+    def ffmpeg_stats(self) -> str:
+        """排程器的名額使用情況與每個 FFmpeg 行程的 CPU 與記憶體用量。"""
+        summary = ffmpeg_scheduler.summary()
+        lines = [
+            f"**名額:** `{summary['active']}/{summary['max_concurrent']} 使用中, "
+            f"{summary['waiting']} 排隊`",
+            f"**累計:** `配發 {summary['granted']}, 排隊 {summary['queued']}, "
+            f"讓出 {summary['preempted']}, 終止 {summary['reaped']}`",
+        ]
+        processes = ffmpeg_scheduler.process_stats()
+        for entry in processes[:STATS_MAX_PROCESSES]:
+            cpu = (
+                f"{entry['cpu_percent']:.0f}%"
+                if entry["cpu_percent"] is not None
+                else "N/A"
+            )
+            rss = f"{entry['rss_mb']:.0f} MB" if entry["rss_mb"] is not None else "N/A"
+            lines.append(
+                f"`{entry['pid'] or '-'}` {entry['kind']}: CPU {cpu}, RSS {rss}, "
+                f"已執行 {music_utils.format_time(entry['age'])}"
+            )
+        if len(processes) > STATS_MAX_PROCESSES:
+            lines.append(f"...以及其他 {len(processes) - STATS_MAX_PROCESSES} 個行程")
+        return "\n".join(lines)
+
+    def ticker_stats(self) -> str:
+        """播放進度訊息的編輯頻率與限速退避狀態。"""
+        summary = ui_ticker.summary()
+        return (
+            f"**更新中:** `{summary['guilds']} 個伺服器, 退避 {summary['backoff']:.1f} 倍`\n"
+            f"**最近一分鐘:** `{summary['edits_last_minute']} 次編輯, "
+            f"每個伺服器 {summary['edits_per_guild_per_minute']:.1f} 次`\n"
+            f"**累計:** `編輯 {summary['edits']}, 略過 {summary['skipped']}, "
+            f"限速 {summary['rate_limited']}`"
+        )
+
+    def stream_stats(self) -> str:
+        """音源的播放方式與預讀緩衝的健康狀態。"""
+        playback = music_player.get_playback_stats()
+        health = get_buffer_health()
+        min_fill = (
+            f"{health['min_fill_ratio']:.0%}"
+            if health["min_fill_ratio"] is not None
+            else "N/A"
+        )
+        return (
+            f"**音源:** `直通 {playback['copy']}, 重新編碼 {playback['transcode']}, "
+            f"快取 {playback['cached']} (直通比例 {playback['copy_ratio']:.0%})`\n"
+            f"**預讀緩衝:** `{health['active']} 個使用中, 最低填充 {min_fill}`\n"
+            f"**累計:** `見底 {health['underruns']}, 重新連線 {health['reconnects']}, "
+            f"失敗 {health['failures']}, "
+            f"已下載 {health['bytes_fetched'] / 1024**2:.1f} MB`"
+        )
+
+    def session_stats(self) -> str:
+        """閒置連線池的沿用情況與指令信箱的排隊、合併統計。"""
+        idle = idle_pool.summary()
+        actors = music_actors.summary()
+        return (
+            f"**閒置連線:** `{idle['idle']}/{idle['max_idle']} 保留中, "
+            f"沿用 {idle['reused']}, 逾時 {idle['expired']}, 淘汰 {idle['evicted']}`\n"
+            f"**連線時間:** `平均 {idle['average_connect_seconds']:.2f} 秒, "
+            f"沿用省下 {idle['saved_connect_seconds']:.1f} 秒`\n"
+            f"**指令信箱:** `{actors['actors']} 個伺服器, {actors['pending']} 排隊中`\n"
+            f"**累計:** `送出 {actors['submitted']}, 執行 {actors['handled']}, "
+            f"合併 {actors['coalesced']}`"
+        )
@@ -0,0 +1,203 @@
+import discord
+import logging
+import os
+import shlex
+
+from .music_buffer import READAHEAD_ENABLED, ReadAheadBuffer
+from .music_cache import audio_cache
+from .music_scheduler import Slot, ffmpeg_scheduler
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("Music_Player")
+
+# Opus 音源直接複製封包，省下重新編碼的 CPU；設為 0 停用
+OPUS_PASSTHROUGH = os.getenv("MUSIC_OPUS_PASSTHROUGH", "1") == "1"
+# 直通的封包無法套用音量濾鏡，啟用直通時重新編碼也維持原音量，曲目之間音量才會一致
+TRANSCODE_VOLUME = (
+    1.0 if OPUS_PASSTHROUGH else float(os.getenv("MUSIC_TRANSCODE_VOLUME", "0.3"))
+)
+VOLUME_FILTER = (
+    ["-filter:a", f"volume={TRANSCODE_VOLUME}"] if TRANSCODE_VOLUME != 1.0 else []
+)
+
+OPUS_CODECS = ("opus", "libopus")
+
+ffmpeg_options = {
+    "before_options": "-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5",
+    "options": shlex.join(["-vn", *VOLUME_FILTER]),
+}
+
+passthrough_options = {
+    "before_options": ffmpeg_options["before_options"],
+    "options": "-vn",
+}
+
+playback_stats = {"copy": 0, "transcode": 0, "cached": 0}
+
+
+async def detect_codec(song_data: dict) -> str | None:
+    """
+    取得音源的編碼格式。
+
+    優先使用解析階段已取得的 `acodec`，缺少時才以 ffprobe 探測。
+    """
+    codec = song_data.get("acodec")
+    if codec:
+        return codec
+    codec, _ = await discord.FFmpegOpusAudio.probe(song_data["song_url"])
+    logger.info(f"探測到音源編碼: {codec}")
+    return codec
+
+
+class ManagedOpusAudio(discord.FFmpegOpusAudio):
+    """
+    由排程器管理的音源。
+
+    FFmpeg 行程啟動後向排程器登記，清理時釋放名額並停止預讀緩衝。
+    """
+
+    def __init__(
+        self,
+        source: str,
+        *,
+        slot: Slot,
+        buffer: ReadAheadBuffer | None = None,
+        **kwargs,
+    ):
+        self.slot = slot
+        self.buffer = buffer
+        try:
+            if buffer is not None:
+                super().__init__(buffer, pipe=True, **kwargs)
+            else:
+                super().__init__(source, **kwargs)
+        except Exception:
+            self._release()
+            raise
+
+    def _spawn_process(self, args, **subprocess_kwargs):
+        process = super()._spawn_process(args, **subprocess_kwargs)
+        self.slot.attach(process.pid)
+        return process
+
+    def cleanup(self) -> None:
+        super().cleanup()
+        self._release()
+
+    def _release(self):
+        if self.buffer is not None:
+            self.buffer.close()
+        self.slot.release()
+
+
+def encode_args(codec: str | None) -> list[str]:
+    """回傳與即時播放相同音量策略的 FFmpeg 編碼參數，供寫入快取使用。"""
+    if OPUS_PASSTHROUGH and codec in OPUS_CODECS:
+        return ["-c:a", "copy"]
+    return [*VOLUME_FILTER, "-c:a", "libopus", "-b:a", "128k"]
+
+
+def accepted_encode_args() -> list[list[str]]:
+    """目前設定下與即時播放音量一致的快取編碼參數。"""
+    if OPUS_PASSTHROUGH:
+        return [encode_args(OPUS_CODECS[0]), encode_args(None)]
+    return [encode_args(None)]
+
+
+async def create_source(
+    song_data: dict, guild_id: int, offset: float = 0
+) -> discord.FFmpegOpusAudio:
+    """
+    建立播放用的音源。
+
+    命中本地快取時直接讀取快取檔案；Opus 音源直接複製封包 (codec=copy)，
+    其餘音源以 libopus 重新編碼並套用音量。遠端音源預設經由預讀緩衝輸入。
+    FFmpeg 行程需先向排程器取得名額。
+
+    :param offset: 從第幾秒開始播放，大於 0 時使用 FFmpeg 的輸入端跳轉。
+    """
+    seek_options = f"-ss {offset:.2f}" if offset > 0 else ""
+
+    # 只接受與目前音量策略相同的快取檔案，切換直通設定前寫入的檔案會被視為過期
+    cached_path = audio_cache.lookup(
+        song_data.get("track_id"), accepted_args=accepted_encode_args()
+    )
+    if cached_path:
+        slot = await ffmpeg_scheduler.acquire("playback", owner=guild_id)
+        try:
+            source = ManagedOpusAudio(
+                cached_path,
+                slot=slot,
+                codec="copy",
+                before_options=seek_options,
+                options="-vn",
+            )
+        except Exception:
+            slot.release()
+            raise
+        playback_stats["cached"] += 1
+        logger.info(f"使用本地快取播放: {song_data.get('track_id')}")
+        return source
+
+    song_url = song_data["song_url"]
+    codec = await detect_codec(song_data) if OPUS_PASSTHROUGH else None
+    slot = await ffmpeg_scheduler.acquire("playback", owner=guild_id)
+    try:
+        source = _open_remote(song_data, song_url, codec, slot, offset, seek_options)
+    except Exception:
+        # 建立音源失敗時名額不會隨清理釋放，需在這裡歸還 (重複釋放無副作用)
+        slot.release()
+        raise
+
+    logger.info(
+        f"音源編碼: {codec or 'unknown'} "
+        f"(copy: {playback_stats['copy']}, transcode: {playback_stats['transcode']}, "
+        f"cached: {playback_stats['cached']})"
+    )
+    return source
+
+
+def _open_remote(
+    song_data: dict,
+    song_url: str,
+    codec: str | None,
+    slot: Slot,
+    offset: float,
+    seek_options: str,
+) -> ManagedOpusAudio:
+    if offset <= 0:
+        audio_cache.record_play(song_data, encode_args(codec))
+
+    mode = "copy" if codec in OPUS_CODECS else "transcode"
+    codec_kwargs = {"codec": "copy"} if mode == "copy" else {}
+    options = passthrough_options if mode == "copy" else ffmpeg_options
+
+    if offset > 0:
+        # 跳轉時直接讀取遠端網址，讓 FFmpeg 以 Range 請求定位，不必下載前段內容
+        options = {
+            **options,
+            "before_options": f"{options['before_options']} {seek_options}",
+        }
+        source = ManagedOpusAudio(song_url, slot=slot, **codec_kwargs, **options)
+    elif READAHEAD_ENABLED:
+        # 經由預讀緩衝從 stdin 輸入，不需要 FFmpeg 的重新連線參數
+        source = ManagedOpusAudio(
+            song_url,
+            slot=slot,
+            buffer=ReadAheadBuffer(song_url),
+            **codec_kwargs,
+            options=options["options"],
+        )
+    else:
+        source = ManagedOpusAudio(song_url, slot=slot, **codec_kwargs, **options)
+    playback_stats[mode] += 1
+    return source
+
+
+def get_playback_stats() -> dict:
+    """回傳直通、重新編碼與快取播放的串流數量。"""
+    total = sum(playback_stats.values())
+    return {
+        **playback_stats,
+        "copy_ratio": playback_stats["copy"] / total if total else 0.0,
+    }
@@ -0,0 +1,104 @@
+import asyncio
+import discord
+import logging
+import os
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("Music_Presence")
+
+# 語音頻道沒有真人後，等待多久才斷線 (秒)
+EMPTY_GRACE_SECONDS = float(os.getenv("MUSIC_EMPTY_GRACE_SECONDS", "30"))
+
+
+def has_humans(channel) -> bool:
+    return any(not member.bot for member in channel.members)
+
+
+class MusicVoiceClient(discord.VoiceClient):
+    """
+    記錄語音連線是否被外部中斷的語音客戶端。
+
+    暫時性的斷線由 discord.py 自行重新連線；連線仍存在時收到離開頻道的事件，
+    代表機器人被管理員中斷或頻道被刪除，此時不應自動重新加入。
+    """
+
+    def __init__(self, client: discord.Client, channel):
+        super().__init__(client, channel)
+        self.disconnected_externally = False
+
+    async def on_voice_state_update(self, data):
+        # discord.py 重新連線失敗或自行斷線時，收到事件前連線就已經關閉
+        if data["channel_id"] is None and self.is_connected():
+            self.disconnected_externally = True
+        await super().on_voice_state_update(data)
+
+
+class EmptyChannelWatcher:
+    """
+    由語音狀態事件驅動的空頻道偵測。
+
+    機器人所在頻道的真人全部離開時開始計時，寬限期內有人加入則取消；
+    只在相關事件發生時檢查成員，不需要定期輪詢。
+    """
+
+    def __init__(self, grace_seconds: float = EMPTY_GRACE_SECONDS, on_empty=None):
+        self.grace_seconds = grace_seconds
+        self.on_empty = on_empty
+        self._pending: dict[int, asyncio.Task] = {}
+
+    def handle_voice_state_update(self, guild_id: int, channel, before, after):
+        """
+        處理一次語音狀態變更。
+
+        :param guild_id: 事件所屬的伺服器 ID。
+        :param channel: 機器人目前所在的語音頻道，未連線時為 None。
+        :param before: 變更前的 `VoiceState`。
+        :param after: 變更後的 `VoiceState`。
+        """
+        if channel is None:
+            self.cancel(guild_id)
+            return
+
+        before_id = before.channel.id if before.channel else None
+        after_id = after.channel.id if after.channel else None
+        if before_id == after_id or channel.id not in (before_id, after_id):
+            return
+
+        if has_humans(channel):
+            if self.cancel(guild_id):
+                logger.info(f"有成員重新加入，取消斷線倒數: {guild_id}")
+        elif guild_id not in self._pending:
+            logger.info(
+                f"語音頻道已無成員，{self.grace_seconds:.0f} 秒後斷線: {guild_id}"
+            )
+            self._pending[guild_id] = asyncio.create_task(
+                self._expire(guild_id, channel)
+            )
+
+    def cancel(self, guild_id: int) -> bool:
+        """取消指定伺服器的斷線倒數，回傳是否有倒數被取消。"""
+        task = self._pending.pop(guild_id, None)
+        if task is None:
+            return False
+        task.cancel()
+        return True
+
+    def is_pending(self, guild_id: int) -> bool:
+        return guild_id in self._pending
+
+    async def _expire(self, guild_id: int, channel):
+        try:
+            await asyncio.sleep(self.grace_seconds)
+        except asyncio.CancelledError:
+            return
+        self._pending.pop(guild_id, None)
+        if has_humans(channel):
+            return
+        logger.info(
+            f"No users left in voice channel for guild {guild_id}. Stopping playback."
+        )
+        if self.on_empty:
+            await self.on_empty(guild_id)
+
+
+empty_channel_watcher = EmptyChannelWatcher()
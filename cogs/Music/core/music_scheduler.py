@@ -0,0 +1,226 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+
+import psutil
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("Music_Scheduler")
+
+MAX_CONCURRENT = int(
+    os.getenv("MUSIC_FFMPEG_MAX_CONCURRENT", str(max(8, (os.cpu_count() or 1) * 4)))
+)
+# 等待空閒名額的上限秒數，超過時放棄播放
+ACQUIRE_TIMEOUT = float(os.getenv("MUSIC_FFMPEG_ACQUIRE_TIMEOUT", "30"))
+PLAYBACK_NICE = int(os.getenv("MUSIC_FFMPEG_PLAYBACK_NICE", "0"))
+PREFETCH_NICE = int(os.getenv("MUSIC_FFMPEG_PREFETCH_NICE", "15"))
+
+# 數字越小優先度越高
+PRIORITIES = {"playback": 0, "prefetch": 1}
+NICENESS = {"playback": PLAYBACK_NICE, "prefetch": PREFETCH_NICE}
+
+
+class Slot:
+    """一個 FFmpeg 執行名額，隨行程結束或清理時釋放。"""
+
+    def __init__(self, scheduler: "FFmpegScheduler", kind: str, owner):
+        self.scheduler = scheduler
+        self.kind = kind
+        self.owner = owner
+        self.process: psutil.Process | None = None
+        self.started = time.monotonic()
+        self.released = False
+
+    def attach(self, pid: int):
+        """綁定實際啟動的 FFmpeg 行程。"""
+        self.scheduler._register(self, pid)
+
+    def release(self):
+        """釋放名額；可在任何執行緒呼叫，重複呼叫無副作用。"""
+        if self.released:
+            return
+        self.released = True
+        loop = self.scheduler._loop
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if loop is None or running is loop:
+            self.scheduler._release(self)
+            return
+        try:
+            loop.call_soon_threadsafe(self.scheduler._release, self)
+        except RuntimeError:
+            # 事件迴圈已關閉，直接釋放
+            self.scheduler._release(self)
+
+
+class FFmpegScheduler:
+    """
+    追蹤所有 FFmpeg 行程的全域排程器。
+
+    限制同時執行的行程數量，播放優先於快取預取，並負責清理殘留行程。
+    """
+
+    def __init__(self, max_concurrent: int):
+        self.max_concurrent = max_concurrent
+        self.stats = {"granted": 0, "queued": 0, "preempted": 0, "reaped": 0}
+        self._active: set[Slot] = set()
+        self._waiters: list = []
+        self._sequence = itertools.count()
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    async def acquire(
+        self, kind: str, owner=None, timeout: float | None = ACQUIRE_TIMEOUT
+    ) -> Slot:
+        """
+        取得一個執行名額，名額已滿時依優先度排隊。
+
+        :param kind: `playback` 或 `prefetch`。
+        :param owner: 名額所屬的伺服器 ID，供清理時使用。
+        :param timeout: 等待上限秒數，逾時拋出 `asyncio.TimeoutError`。
+        """
+        self._loop = asyncio.get_running_loop()
+        self._reap_exited()
+        slot = Slot(self, kind, owner)
+
+        if len(self._active) < self.max_concurrent and not self._waiters:
+            self._grant(slot)
+            return slot
+
+        self.stats["queued"] += 1
+        future = self._loop.create_future()
+        heapq.heappush(
+            self._waiters, (PRIORITIES[kind], next(self._sequence), future, slot)
+        )
+        logger.warning(
+            f"FFmpeg 名額已滿 ({len(self._active)}/{self.max_concurrent})，"
+            f"{kind} 排隊中"
+        )
+        if kind == "playback":
+            self._preempt_prefetch()
+
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"等待 FFmpeg 名額逾時 ({kind}, owner={owner})")
+            raise
+
+    def reap(self, owner):
+        """終止指定伺服器仍在執行的 FFmpeg 行程。"""
+        for slot in [s for s in self._active if s.owner == owner]:
+            self._terminate(slot)
+
+    def reap_orphans(self):
+        """終止不在追蹤名單中的 FFmpeg 子行程，例如重新載入前遺留的行程。"""
+        tracked = {s.process.pid for s in self._active if s.process}
+        try:
+            children = psutil.Process().children(recursive=True)
+        except psutil.Error:
+            return
+        for child in children:
+            try:
+                if child.pid not in tracked and "ffmpeg" in child.name().lower():
+                    logger.warning(f"終止殘留的 FFmpeg 行程: {child.pid}")
+                    child.kill()
+                    self.stats["reaped"] += 1
+            except psutil.Error:
+                continue
+
+    def process_stats(self) -> list[dict]:
+        """回傳每個 FFmpeg 行程的 CPU 與記憶體用量。"""
+        self._reap_exited()
+        results = []
+        for slot in list(self._active):
+            entry = {
+                "kind": slot.kind,
+                "owner": slot.owner,
+                "pid": None,
+                "cpu_percent": None,
+                "rss_mb": None,
+                "age": time.monotonic() - slot.started,
+            }
+            if slot.process:
+                entry["pid"] = slot.process.pid
+                try:
+                    with slot.process.oneshot():
+                        entry["cpu_percent"] = slot.process.cpu_percent(None)
+                        entry["rss_mb"] = slot.process.memory_info().rss / 1024**2
+                except psutil.Error:
+                    pass
+            results.append(entry)
+        return results
+
+    def summary(self) -> dict:
+        return {
+            "active": len(self._active),
+            "max_concurrent": self.max_concurrent,
+            "waiting": len(self._waiters),
+            **self.stats,
+        }
+
+    def _grant(self, slot: Slot):
+        self._active.add(slot)
+        self.stats["granted"] += 1
+
+    def _register(self, slot: Slot, pid: int):
+        try:
+            slot.process = psutil.Process(pid)
+            nice = NICENESS.get(slot.kind, 0)
+            if nice:
+                slot.process.nice(nice)
+            if slot.kind == "prefetch" and hasattr(psutil, "IOPRIO_CLASS_IDLE"):
+                slot.process.ionice(psutil.IOPRIO_CLASS_IDLE)
+            # 第一次呼叫只建立基準值
+            slot.process.cpu_percent(None)
+        except psutil.Error as e:
+            logger.warning(f"無法設定 FFmpeg 行程 {pid} 的優先度: {e}")
+
+    def _release(self, slot: Slot):
+        self._active.discard(slot)
+        while self._waiters and len(self._active) < self.max_concurrent:
+            _, _, future, waiter = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self._grant(waiter)
+            future.set_result(waiter)
+
+    def _terminate(self, slot: Slot):
+        if slot.process:
+            try:
+                if slot.process.is_running():
+                    slot.process.kill()
+                    self.stats["reaped"] += 1
+                    logger.info(f"已終止 FFmpeg 行程 {slot.process.pid} ({slot.kind})")
+            except psutil.Error:
+                pass
+        slot.release()
+
+    def _reap_exited(self):
+        for slot in list(self._active):
+            if slot.process is None:
+                continue
+            try:
+                alive = (
+                    slot.process.is_running()
+                    and slot.process.status() != psutil.STATUS_ZOMBIE
+                )
+            except psutil.Error:
+                alive = False
+            if not alive:
+                slot.release()
+
+    def _preempt_prefetch(self):
+        prefetching = [s for s in self._active if s.kind == "prefetch" and s.process]
+        if not prefetching:
+            return
+        victim = max(prefetching, key=lambda s: s.started)
+        logger.warning(f"為播放讓出名額，終止預取行程 {victim.process.pid}")
+        self.stats["preempted"] += 1
+        self._terminate(victim)
+
+
+ffmpeg_scheduler = FFmpegScheduler(max_concurrent=MAX_CONCURRENT)
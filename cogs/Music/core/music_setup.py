@@ -1,20 +1,16 @@
 import discord
 import logging
-import os
 
 from discord import app_commands
 from discord.ext import commands
-from pymongo import MongoClient
-from mongo_crud import MongoCRUD
+from executors import db_executor
+from mongo_crud import MongoCRUD, get_client
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("Music_Setup")
 
-mongo_uri = os.getenv("MONGO_URI")
-mongo_client = MongoClient(mongo_uri, serverSelectionTimeoutMS=15000)
-
 db_handler = MongoCRUD(
-    client=mongo_client,
+    client=get_client,
     db_name="Norvireon_bot_db",
     collection_name="Music_data",
     logger=logger,
@@ -38,16 +34,22 @@ class MusicSetup(commands.Cog):
         self, itat: discord.Interaction, channel: discord.TextChannel = None
     ):
         if channel:
-            db_handler.update_one(
-                query={}, new_values={"music_channel_id": channel.id}, upsert=True
+            await db_executor.run(
+                db_handler.update_one,
+                query={},
+                new_values={"music_channel_id": channel.id},
+                upsert=True,
             )
             await itat.response.send_message(
                 f"已設定{channel.mention}作為音樂指令頻道。", ephemeral=True
             )
         else:
             # If no channel is provided, remove the restriction
-            db_handler.update_one(
-                query={}, new_values={"music_channel_id": None}, upsert=True
+            await db_executor.run(
+                db_handler.update_one,
+                query={},
+                new_values={"music_channel_id": None},
+                upsert=True,
             )
             await itat.response.send_message("音樂指令已在所有頻道允許", ephemeral=True)
 
@@ -56,16 +58,22 @@ class MusicSetup(commands.Cog):
     @app_commands.checks.has_permissions(manage_guild=True)
     async def set_dj_role(self, itat: discord.Interaction, role: discord.Role = None):
         if role:
-            db_handler.update_one(
-                query={}, new_values={"dj_role_id": role.id}, upsert=True
+            await db_executor.run(
+                db_handler.update_one,
+                query={},
+                new_values={"dj_role_id": role.id},
+                upsert=True,
             )
             await itat.response.send_message(
                 f"`{role.name}` 已被設為'DJ'的身分組。", ephemeral=True
             )
         else:
             # If no role is provided, remove the DJ role
-            db_handler.update_one(
-                query={}, new_values={"dj_role_id": None}, upsert=True
+            await db_executor.run(
+                db_handler.update_one,
+                query={},
+                new_values={"dj_role_id": None},
+                upsert=True,
             )
             await itat.response.send_message(
                 "DJ身分組已被移除，僅管理員可控制音樂播放。", ephemeral=True
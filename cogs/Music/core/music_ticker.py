@@ -0,0 +1,173 @@
+import asyncio
+import collections
+import discord
+import logging
+import os
+import time
+
+
+from executors import db_executor
+from mongo_crud import MongoCRUD, get_client
+from . import music_utils
+from .music_data import voice_data
+from .view.control_views import ControlView
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("Music_Ticker")
+
+# 同一則訊息兩次編輯的最短與最長間隔 (秒)
+MIN_INTERVAL = float(os.getenv("MUSIC_UI_MIN_INTERVAL", "5"))
+MAX_INTERVAL = float(os.getenv("MUSIC_UI_MAX_INTERVAL", "30"))
+TICK_SECONDS = 1.0
+# 編輯請求超過此秒數視為正在排隊等待速率限制
+SLOW_EDIT_SECONDS = 1.0
+MAX_BACKOFF = 8.0
+
+db_handler = MongoCRUD(
+    client=get_client,
+    db_name="Norvireon_bot_db",
+    collection_name="Music_data",
+    logger=logger,
+)
+
+
+class UITicker:
+    """
+    以單一排程更新所有伺服器的播放進度訊息。
+
+    依曲目長度與進度條解析度決定下次更新時間，畫面不變時不發送編輯請求，
+    編輯請求變慢或遭到限速時整體放慢更新頻率。
+    """
+
+    def __init__(self):
+        self.backoff = 1.0
+        self.stats = {"edits": 0, "skipped": 0, "rate_limited": 0}
+        self._guilds: dict[int, dict] = {}
+        self._edit_times: collections.deque = collections.deque()
+        self._task: asyncio.Task | None = None
+
+    def register(self, guild_id: int):
+        """開始更新指定伺服器的播放訊息，立即進行第一次更新。"""
+        self._guilds[guild_id] = {"next_due": 0.0, "last_key": None, "last_edit": 0.0}
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def unregister(self, guild_id: int):
+        self._guilds.pop(guild_id, None)
+
+    def poke(self, guild_id: int):
+        """播放狀態改變時呼叫，讓下一個週期立即更新。"""
+        state = self._guilds.get(guild_id)
+        if state:
+            state["next_due"] = 0.0
+
+    def summary(self) -> dict:
+        """回傳更新統計，包含每個伺服器每分鐘的編輯次數。"""
+        self._trim_edit_times(time.monotonic())
+        guilds = len(self._guilds)
+        return {
+            "guilds": guilds,
+            "backoff": self.backoff,
+            "edits_last_minute": len(self._edit_times),
+            "edits_per_guild_per_minute": (
+                len(self._edit_times) / guilds if guilds else 0.0
+            ),
+            **self.stats,
+        }
+
+    async def _run(self):
+        while self._guilds:
+            try:
+                now = time.monotonic()
+                for guild_id in list(self._guilds):
+                    if "client" not in voice_data.get(guild_id, {}):
+                        self.unregister(guild_id)
+                due = [
+                    guild_id
+                    for guild_id, state in self._guilds.items()
+                    if state["next_due"] <= now
+                ]
+                if due:
+                    await asyncio.gather(*(self._update(guild_id) for guild_id in due))
+            except Exception as e:
+                logger.error(f"UI ticker encountered an error: {e}")
+            await asyncio.sleep(TICK_SECONDS)
+
+    async def _update(self, guild_id: int):
+        state = self._guilds.get(guild_id)
+        embed_msg: discord.Message = voice_data.get(guild_id, {}).get(
+            "state_embed_message"
+        )
+        if state is None or embed_msg is None:
+            return
+        if len(embed_msg.embeds) == 0:
+            logger.warning(f"Embed message has no embeds for guild {guild_id}.")
+            self.unregister(guild_id)
+            return
+
+        documents = await db_executor.run(db_handler.get, query={"_id": guild_id})
+        if not documents:
+            return
+        data = documents[0]
+        filled_length, elapsed = music_utils.get_progress_position(data)
+        key = (data.get("is_playing"), filled_length)
+        now = time.monotonic()
+        state["next_due"] = now + self._next_interval(data, filled_length, elapsed)
+
+        # 暫停時畫面完全不變；播放中進度條未前進時只偶爾刷新時間顯示
+        if key == state["last_key"] and (
+            not data.get("is_playing") or now - state["last_edit"] < MAX_INTERVAL
+        ):
+            self.stats["skipped"] += 1
+            return
+
+        embed = embed_msg.embeds[0]
+        embed.description = music_utils.generate_progress_bar(guild_id, data)
+        edit_kwargs = {"embed": embed}
+        # 按鈕只在暫停狀態改變時才需要更新
+        if state["last_key"] is None or state["last_key"][0] != key[0]:
+            edit_kwargs["view"] = ControlView.render(is_paused=not key[0])
+        started = time.monotonic()
+        try:
+            await embed_msg.edit(**edit_kwargs)
+        except discord.NotFound:
+            self.unregister(guild_id)
+            return
+        except discord.HTTPException as e:
+            if e.status == 429:
+                self.stats["rate_limited"] += 1
+                self._slow_down()
+            logger.warning(f"Failed to edit progress message for {guild_id}: {e}")
+            return
+
+        finished = time.monotonic()
+        if finished - started > SLOW_EDIT_SECONDS:
+            self._slow_down()
+        else:
+            self.backoff = max(1.0, self.backoff * 0.9)
+        state["last_key"] = key
+        state["last_edit"] = finished
+        self.stats["edits"] += 1
+        self._edit_times.append(finished)
+        self._trim_edit_times(finished)
+
+    def _next_interval(self, data: dict, filled_length: int, elapsed: int) -> float:
+        duration = data.get("duration") or 0
+        if not data.get("is_playing") or duration == 0:
+            interval = MAX_INTERVAL
+        else:
+            # 等到進度條前進一格時再更新
+            step = duration / music_utils.PROGRESS_BAR_LENGTH
+            interval = (filled_length + 1) * step - elapsed
+        return min(max(interval, MIN_INTERVAL), MAX_INTERVAL) * self.backoff
+
+    def _slow_down(self):
+        self.backoff = min(self.backoff * 2, MAX_BACKOFF)
+        logger.warning(f"Discord 編輯請求壅塞，進度更新放慢為 {self.backoff:.1f} 倍")
+
+    def _trim_edit_times(self, now: float):
+        while self._edit_times and now - self._edit_times[0] > 60:
+            self._edit_times.popleft()
+
+
+ui_ticker = UITicker()
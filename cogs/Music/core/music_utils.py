@@ -6,24 +6,14 @@ import urllib.parse
 from discord import Interaction as Itat
 from discord.ext import commands
 from discord.utils import get
-from mongo_crud import MongoCRUD
-from pymongo import MongoClient
+from mongo_crud import MongoCRUD, get_client
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("Music_Utils")
 
-mongo_client = MongoClient("mongodb://localhost:27017/", serverSelectionTimeoutMS=15000)
-
 music_db_handler = MongoCRUD(
-    client=mongo_client,
-    db_name="Norvireon_bot_db",
-    collection_name="Music_data",
-    logger=logger,
-)
-
-db_handler = MongoCRUD(
-    client=mongo_client,
+    client=lambda: get_client("mongodb://localhost:27017/"),
     db_name="Norvireon_bot_db",
     collection_name="Music_data",
     logger=logger,
@@ -36,26 +26,53 @@ def format_time(seconds):
     return f"{hours}:{mins:02}:{secs:02}" if hours > 0 else f"{mins}:{secs:02}"
 
 
-def generate_progress_bar(guild_id):
-    data = db_handler.get(query={"_id": guild_id})[0]
+def parse_time(text: str):
+    """將 `1:23:45`、`2:30` 或 `90` 格式的時間轉換為秒數，格式錯誤時回傳 None。"""
+    try:
+        parts = [int(part) for part in text.strip().split(":")]
+    except ValueError:
+        return None
+    if not 1 <= len(parts) <= 3 or any(part < 0 for part in parts):
+        return None
+    seconds = 0
+    for part in parts:
+        seconds = seconds * 60 + part
+    return seconds
+
+
+def get_elapsed(data):
+    """根據資料庫中的播放狀態計算目前播放位置 (秒)。"""
+    start_time = data.get("start_time")
+    if start_time is None:
+        return 0
+    total_paused_duration = data.get("total_paused_duration") or 0
+    if not data.get("is_playing"):
+        pause_time = data.get("pause_time") or start_time
+        return max(0, pause_time - start_time - total_paused_duration)
+    return max(0, time.time() - start_time - total_paused_duration)
+
+
+PROGRESS_BAR_LENGTH = 20
+
+
+def get_progress_position(data):
+    """回傳 (進度條填滿格數, 已播放秒數)。"""
+    duration = data.get("duration") or 0
+    elapsed = int(get_elapsed(data))
+    if duration == 0:
+        return 0, elapsed
+    progress = min(elapsed / duration, 1.0)
+    return int(PROGRESS_BAR_LENGTH * progress), elapsed
+
+
+def generate_progress_bar(guild_id, data):
     is_playing = data.get("is_playing")
-    start_time = data["start_time"]
     duration = data["duration"]
-    total_paused_duration = data["total_paused_duration"]
-    author = data.get("author", "Unknown Artist")
     if duration == 0:
         return ""
-    if total_paused_duration is None:
-        total_paused_duration = 0
 
-    if not is_playing:
-        pause_time = data.get("pause_time", start_time)
-        elapsed = int(pause_time - start_time - total_paused_duration)
-    else:
-        elapsed = int(time.time() - start_time - total_paused_duration)
-    progress = min(elapsed / duration, 1.0)
-    length = 20
-    filled_length = int(length * progress)
+    filled_length, elapsed = get_progress_position(data)
+    length = PROGRESS_BAR_LENGTH
     bar = "─" * filled_length + "•" + "─" * (length - filled_length - 1)
 
     if is_playing:
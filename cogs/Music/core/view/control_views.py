@@ -2,10 +2,28 @@ import discord
 
 
 class ControlView(discord.ui.View):
-    def __init__(self, guild_id: int):
+    """
+    播放控制按鈕。
+
+    按鈕使用固定的 custom_id，由啟動時以 `bot.add_view` 註冊的常駐 view 處理互動，
+    點擊時才讀取伺服器狀態，因此不需要為每則訊息建立新的 view。
+    """
+
+    def __init__(self, is_paused: bool = False):
         super().__init__(timeout=None)
         from .music_view import Views
 
-        self.add_item(Views.PauseResumeButton(guild_id))
-        self.add_item(Views.SkipButton(guild_id))
-        self.add_item(Views.StopButton(guild_id))
+        self.add_item(Views.PauseResumeButton(is_paused))
+        self.add_item(Views.SkipButton())
+        self.add_item(Views.StopButton())
+
+    @classmethod
+    def render(cls, is_paused: bool = False) -> "ControlView":
+        """
+        產生只用於訊息外觀的 view。
+
+        已停止的 view 不會被存入 view store，互動會交給常駐 view 處理。
+        """
+        view = cls(is_paused)
+        view.stop()
+        return view
@@ -1,23 +1,18 @@
 import discord
 import logging
-import os
 
 from discord import ButtonStyle
 from discord.ui import Button
-from pymongo import MongoClient
 
-from mongo_crud import MongoCRUD
+from mongo_crud import MongoCRUD, get_client
 from ..music_checkers import Checkers
 from ..music_functions import Functions
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("Music_Core")
 
-mongo_uri = os.getenv("MONGO_URI")
-mongo_client = MongoClient(mongo_uri, serverSelectionTimeoutMS=15000)
-
 db_handler = MongoCRUD(
-    client=mongo_client,
+    client=get_client,
     db_name="Norvireon_bot_db",
     collection_name="Music_data",
     logger=logger,
@@ -27,19 +22,18 @@ db_handler = MongoCRUD(
 class Views:
     # A button that toggles between Pause and Resume
     class PauseResumeButton(discord.ui.Button):
-        def __init__(self, guild_id: int):
-            self.data = db_handler.get(query={"_id": guild_id})[0]
-            self.is_paused = not (self.data.get("is_playing"))
-            # Set style and label based on the current state
-            style = ButtonStyle.green if self.is_paused else ButtonStyle.primary
-            label = "繼續" if self.is_paused else "暫停"
-            emoji = "▶️" if self.is_paused else "⏸️"
+        def __init__(self, is_paused: bool = False):
+            # Set style and label based on the state when the message was rendered
+            style = ButtonStyle.green if is_paused else ButtonStyle.primary
+            label = "繼續" if is_paused else "暫停"
+            emoji = "▶️" if is_paused else "⏸️"
 
-            super().__init__(style=style, label=label, emoji=emoji)
-            self.guild_id = guild_id
+            super().__init__(
+                style=style, label=label, emoji=emoji, custom_id="music:pause_resume"
+            )
 
         async def callback(self, itat: discord.Interaction):
-            if not Checkers._is_dj(
+            if not await Checkers._is_dj(
                 itat
             ) or not await Checkers._is_in_valid_voice_channel(itat):
                 await itat.response.send_message(
@@ -49,19 +43,21 @@ class Views:
             await itat.response.send_message(
                 "正在處理請求", ephemeral=True, delete_after=5
             )
-            if self.is_paused:
-                await Functions._resume(self.guild_id)
-            else:
-                await Functions._pause(self.guild_id)
+            # The state is read when the toggle runs, the rendered label may be outdated
+            await Functions.request_from(itat, "toggle")
 
     # Button to skip to the next song
     class SkipButton(discord.ui.Button):
-        def __init__(self, guild_id: int):
-            super().__init__(style=ButtonStyle.secondary, label="下一首", emoji="⏭️")
-            self.guild_id = guild_id
+        def __init__(self):
+            super().__init__(
+                style=ButtonStyle.secondary,
+                label="下一首",
+                emoji="⏭️",
+                custom_id="music:skip",
+            )
 
         async def callback(self, itat: discord.Interaction):
-            if not Checkers._is_dj(
+            if not await Checkers._is_dj(
                 itat
             ) or not await Checkers._is_in_valid_voice_channel(itat):
                 await itat.response.send_message(
@@ -71,16 +67,20 @@ class Views:
             await itat.response.send_message(
                 "正在處理請求", ephemeral=True, delete_after=5
             )
-            await Functions._skip(self.guild_id)
+            await Functions.request_from(itat, "skip")
 
     # Button to stop playback and disconnect
     class StopButton(discord.ui.Button):
-        def __init__(self, guild_id: int):
-            super().__init__(style=ButtonStyle.danger, label="停止", emoji="⏹️")
-            self.guild_id = guild_id
+        def __init__(self):
+            super().__init__(
+                style=ButtonStyle.danger,
+                label="停止",
+                emoji="⏹️",
+                custom_id="music:stop",
+            )
 
         async def callback(self, itat: discord.Interaction):
-            if not Checkers._is_dj(
+            if not await Checkers._is_dj(
                 itat
             ) or not await Checkers._is_in_valid_voice_channel(itat):
                 await itat.response.send_message(
@@ -91,7 +91,7 @@ class Views:
                 "正在處理請求", ephemeral=True, delete_after=5
             )
             # We call the main _stop functions which handles everything
-            await Functions._stop(self.guild_id)
+            await Functions.request_from(itat, "stop")
 
     class Regret(Button):
         def __init__(self, guild_id):
@@ -4,8 +4,8 @@ import logging
 import os
 import requests
 from urllib.parse import urlparse
-from pydub import AudioSegment
-import soundfile as sf
+
+from import_timing import lazy_import
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("monster_siren")
@@ -35,6 +35,9 @@ class Monster_siren:
             logger.info("成功獲取 API 元數據！")
 
             audio_url = raw_song_data.get("sourceUrl")
+            audio_format = (
+                os.path.splitext(urlparse(audio_url or "").path)[1].strip(".").lower()
+            )
             calculated_duration = None
             if audio_url:
                 calculated_duration = calculate_duration_from_audio_url(audio_url)
@@ -47,6 +50,10 @@ class Monster_siren:
                 "duration": calculated_duration,
                 "song_url": audio_url,
                 "thumbnail": raw_album_data.get("coverUrl", ""),
+                # 以副檔名標示格式 (wav/mp3)，讓播放端不必再以 ffprobe 探測
+                "acodec": audio_format or None,
+                "track_id": f"monster_siren:{cid}",
+                "webpage_url": page_url,
             }
             return data
         except requests.exceptions.RequestException as e:
@@ -83,6 +90,7 @@ def calculate_duration_from_audio_url(audio_url: str, timeout=15):
             range_response = requests.get(audio_url, headers=headers, timeout=timeout)
             range_response.raise_for_status()
 
+            sf = lazy_import("soundfile")
             with sf.SoundFile(io.BytesIO(range_response.content)) as audio_file:
                 samplerate = audio_file.samplerate
                 channels = audio_file.channels
@@ -122,7 +130,8 @@ def calculate_duration_from_audio_url(audio_url: str, timeout=15):
             raise ValueError("無法從 URL 判斷檔案格式")
 
         audio_bytes = io.BytesIO(full_response.content)
-        audio = AudioSegment.from_file(audio_bytes, format=file_extension)
+        pydub = lazy_import("pydub")
+        audio = pydub.AudioSegment.from_file(audio_bytes, format=file_extension)
 
         logger.info("成功從完整檔案中解析出時長！")
         return audio.duration_seconds
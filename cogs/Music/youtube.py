@@ -1,20 +1,53 @@
 import asyncio
+import collections
 import logging
 import random
 import os
-import yt_dlp
+import time
 
-from googleapiclient.discovery import build
+from executors import ExecutorBusy, extract_executor, http_executor
+from import_timing import lazy_import
 
 YOUTUBE_API_KEY = os.getenv("GOOGLE")
 
 youtube_base_url = "https://www.youtube.com/"
 youtube_watch_url = youtube_base_url + "watch?v="
-youtube = build("youtube", "v3", developerKey=YOUTUBE_API_KEY)
+_youtube_client = None
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("Youtube")
 
+# 解析結果的快取秒數，需短於 YouTube 串流網址的有效期限
+TRACK_CACHE_TTL = int(os.getenv("MUSIC_TRACK_CACHE_TTL", "1800"))
+TRACK_CACHE_SIZE = 256
+
+_track_cache: collections.OrderedDict[str, tuple[float, dict]] = (
+    collections.OrderedDict()
+)
+_inflight: dict[str, asyncio.Task] = {}
+
+
+def get_youtube_client():
+    """第一次使用時才建立 YouTube API 客戶端，使用套件內附的 discovery 文件。"""
+    global _youtube_client
+    if _youtube_client is None:
+        discovery = lazy_import("googleapiclient.discovery")
+        _youtube_client = discovery.build(
+            "youtube",
+            "v3",
+            developerKey=YOUTUBE_API_KEY,
+            static_discovery=True,
+            cache_discovery=False,
+        )
+    return _youtube_client
+
+
+def extract_info(yt_dl_options: dict, url: str):
+    """在執行緒中呼叫 yt-dlp 解析網址。"""
+    yt_dlp = lazy_import("yt_dlp")
+    ytdl = yt_dlp.YoutubeDL(yt_dl_options)
+    return ytdl.extract_info(url=url, download=False)
+
 
 class Youtube:
     @staticmethod
@@ -31,15 +64,9 @@ class Youtube:
             "playlistend": 50,
         }
 
-        ytdl = yt_dlp.YoutubeDL(yt_dl_options)
-
         try:
             logger.info(f"正在提取 URL 的元數據: {url}")
-            raw_data = await asyncio.to_thread(
-                ytdl.extract_info,
-                url=url,
-                download=False,
-            )
+            raw_data = await extract_executor.run(extract_info, yt_dl_options, url)
 
             entries = []
             if raw_data.get("_type") == "playlist":
@@ -59,6 +86,8 @@ class Youtube:
                 )
             return playlist_metadata
 
+        except ExecutorBusy:
+            raise
         except Exception as e:
             logger.error(f"提取元數據時發生錯誤: {e}")
             return None
@@ -83,22 +112,73 @@ class Youtube:
 
     @staticmethod
     async def get_data_from_single(request) -> dict:
+        """
+        解析單一影片。
+
+        已解析過的網址直接從快取回傳；同一網址正在解析時 (例如預先解析中)
+        會等待同一個工作，不會重複解析。
+        """
+        cached = Youtube.get_cached(request)
+        if cached is not None:
+            return cached
+        task = Youtube.resolve_in_background(request)
+        try:
+            return dict(await asyncio.shield(task))
+        except asyncio.CancelledError:
+            if not task.cancelled():
+                raise
+            # 預先解析被取消，改為重新解析
+            return dict(await asyncio.shield(Youtube.resolve_in_background(request)))
+
+    @staticmethod
+    def get_cached(request) -> dict | None:
+        cached = _track_cache.get(request)
+        if cached is None:
+            return None
+        if time.monotonic() - cached[0] >= TRACK_CACHE_TTL:
+            del _track_cache[request]
+            return None
+        _track_cache.move_to_end(request)
+        return dict(cached[1])
+
+    @staticmethod
+    def resolve_in_background(request) -> asyncio.Task:
+        """開始在背景解析影片並寫入快取，回傳解析工作。"""
+        task = _inflight.get(request)
+        if task is None:
+            task = asyncio.create_task(Youtube._extract_single(request))
+            _inflight[request] = task
+            task.add_done_callback(lambda t: Youtube._on_resolved(request, t))
+        return task
+
+    @staticmethod
+    def _on_resolved(request, task: asyncio.Task):
+        _inflight.pop(request, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        _track_cache[request] = (time.monotonic(), task.result())
+        _track_cache.move_to_end(request)
+        while len(_track_cache) > TRACK_CACHE_SIZE:
+            _track_cache.popitem(last=False)
+
+    @staticmethod
+    async def _extract_single(request) -> dict:
         yt_dl_options = {
             "format": "bestaudio/best",
             "noplaylist": True,
             "forcenoplaylist": True,
             "ignoreerrors": True,
         }
-        ytdl = yt_dlp.YoutubeDL(yt_dl_options)
-        raw_data = await asyncio.to_thread(
-            ytdl.extract_info, url=request, download=False
-        )
+        raw_data = await extract_executor.run(extract_info, yt_dl_options, request)
         data = {
             "author": raw_data.get("uploader", "Unknown Artist"),
             "duration": raw_data["duration"],
             "song_url": raw_data["url"],
             "title": raw_data["title"],
             "thumbnail": raw_data.get("thumbnail", ""),
+            "acodec": raw_data.get("acodec"),
+            "track_id": f"youtube:{raw_data['id']}" if raw_data.get("id") else None,
+            "webpage_url": raw_data.get("webpage_url") or request,
         }
         return data
 
@@ -107,16 +187,19 @@ class Youtube:
         search_query: str, max_results: int = 10
     ) -> dict:
         try:
-            loop = asyncio.get_event_loop()
-            request = youtube.search().list(
-                q=search_query,
-                part="snippet",
-                maxResults=max_results,
-                type="video",
-                relevanceLanguage="zh-TW",
-                regionCode="TW",
+            response = await http_executor.run(
+                lambda: get_youtube_client()
+                .search()
+                .list(
+                    q=search_query,
+                    part="snippet",
+                    maxResults=max_results,
+                    type="video",
+                    relevanceLanguage="zh-TW",
+                    regionCode="TW",
+                )
+                .execute()
             )
-            response = await loop.run_in_executor(None, request.execute)
 
             results = []
             for item in response.get("items", []):
@@ -126,6 +209,8 @@ class Youtube:
                 song_url = youtube_watch_url + video_id
                 results.append([song_url, title, author])
             return results
+        except ExecutorBusy:
+            raise
         except Exception as e:
             logger.error(f"get_youtube_search_results error: {e}")
             return []
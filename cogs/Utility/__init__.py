@@ -1,6 +1,9 @@
+from discord import app_commands
 from discord.ext import commands
 from .ping import PingCommands
 from .miq import MIQ
+from . import avatar_cache
+from .host_metrics import host_metrics
 
 
 class Utility(commands.Cog, PingCommands, MIQ):
@@ -8,6 +11,19 @@ class Utility(commands.Cog, PingCommands, MIQ):
         commands.Cog.__init__(self)
         MIQ.__init__(self, bot)
         PingCommands.__init__(self, bot)
+        # 右鍵選單無法在 Cog 中以裝飾器定義，需手動加入指令樹
+        self.quote_menu = app_commands.ContextMenu(
+            name="製作語錄", callback=self.quote_messages
+        )
+
+    async def cog_load(self):
+        self.bot.tree.add_command(self.quote_menu)
+        host_metrics.start(self.bot)
+
+    async def cog_unload(self):
+        self.bot.tree.remove_command(self.quote_menu.name, type=self.quote_menu.type)
+        host_metrics.stop()
+        await avatar_cache.avatar_cache.close()
 
 
 async def setup(bot: commands.Bot):
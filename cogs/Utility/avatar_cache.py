@@ -0,0 +1,221 @@
+import asyncio
+import collections
+import hashlib
+import logging
+import os
+
+import aiohttp
+
+from executors import http_executor, render_executor
+from miq_render import AVATAR_SIZE, prepare_avatar
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("Avatar_Cache")
+
+# 未設定目錄時只使用記憶體快取
+AVATAR_CACHE_DIR = os.getenv("MIQ_AVATAR_CACHE_DIR")
+AVATAR_CACHE_MAX_BYTES = int(
+    os.getenv("MIQ_AVATAR_CACHE_MAX_BYTES", str(256 * 1024**2))
+)
+# 每個頭像約 2.3 MB (768x768 RGBA)
+AVATAR_MEMORY_ITEMS = int(os.getenv("MIQ_AVATAR_MEMORY_ITEMS", "16"))
+# 下載頭像的逾時秒數與檔案大小上限
+AVATAR_FETCH_TIMEOUT = float(os.getenv("MIQ_AVATAR_FETCH_TIMEOUT", "10"))
+AVATAR_MAX_BYTES = int(os.getenv("MIQ_AVATAR_MAX_BYTES", str(8 * 1024**2)))
+
+
+class AvatarCache:
+    """
+    已裁切縮放的頭像像素快取。
+
+    記憶體與磁碟各自以最久未使用淘汰，同一位成員的頭像只需要下載與解碼一次。
+    """
+
+    def __init__(self, directory: str | None, max_disk_bytes: int, memory_items: int):
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.memory_items = memory_items
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._memory: collections.OrderedDict[str, bytes] = collections.OrderedDict()
+        # 檔名 -> 大小，依最後使用時間排序
+        self._disk: collections.OrderedDict[str, int] = collections.OrderedDict()
+        self._loading: dict[str, asyncio.Task] = {}
+        self._session: aiohttp.ClientSession | None = None
+
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            self._scan_disk()
+
+    async def get_avatar(self, key: str, source: str) -> bytes | None:
+        """
+        取得頭像像素資料，未命中時下載並處理後寫入快取。
+
+        :param key: 快取鍵，例如 Discord 頭像雜湊或附件網址。
+        :param source: 頭像的網址或本地檔案路徑。
+        :return: `AVATAR_SIZE` 正方形的 RGBA 像素資料，失敗時回傳 None。
+        """
+        key = f"{key}:{AVATAR_SIZE}"
+        cached = await self._lookup(key)
+        if cached is not None:
+            return cached
+
+        # 同一個頭像同時被多次請求時只處理一次
+        task = self._loading.get(key)
+        if task is None:
+            task = asyncio.create_task(self._load(key, source))
+            self._loading[key] = task
+            task.add_done_callback(lambda _: self._loading.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def fetch(self, url: str) -> bytes | None:
+        """以逾時與大小上限下載圖片，失敗時回傳 None。"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=AVATAR_FETCH_TIMEOUT)
+            )
+        try:
+            async with self._session.get(url) as response:
+                response.raise_for_status()
+                if (response.content_length or 0) > AVATAR_MAX_BYTES:
+                    logger.warning(f"頭像檔案過大，略過: {url}")
+                    return None
+                data = bytearray()
+                async for chunk in response.content.iter_chunked(64 * 1024):
+                    data += chunk
+                    if len(data) > AVATAR_MAX_BYTES:
+                        logger.warning(f"頭像檔案過大，略過: {url}")
+                        return None
+                return bytes(data)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"下載頭像時發生錯誤: {e}")
+            return None
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def summary(self) -> dict:
+        return {
+            "memory_items": len(self._memory),
+            "disk_items": len(self._disk),
+            "disk_bytes": sum(self._disk.values()),
+            **self.stats,
+        }
+
+    async def _load(self, key: str, source: str) -> bytes | None:
+        self.stats["misses"] += 1
+        if source.startswith(("http://", "https://")):
+            image_bytes = await self.fetch(source)
+        else:
+            image_bytes = await http_executor.run(_read_file, source)
+        if image_bytes is None:
+            return None
+
+        avatar = await render_executor.run(prepare_avatar, image_bytes)
+        if avatar is None:
+            return None
+        self._remember(key, avatar)
+        if self.directory:
+            await self._store_disk(key, avatar)
+        return avatar
+
+    async def _lookup(self, key: str) -> bytes | None:
+        avatar = self._memory.get(key)
+        if avatar is not None:
+            self._memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return avatar
+
+        filename = self._filename(key)
+        if filename not in self._disk:
+            return None
+        avatar = await http_executor.run(
+            _read_file, os.path.join(self.directory, filename), True
+        )
+        if avatar is None:
+            self._disk.pop(filename, None)
+            return None
+        self._disk.move_to_end(filename)
+        self.stats["disk_hits"] += 1
+        self._remember(key, avatar)
+        return avatar
+
+    def _remember(self, key: str, avatar: bytes):
+        self._memory[key] = avatar
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _filename(self, key: str) -> str:
+        return hashlib.sha256(key.encode("utf-8")).hexdigest() + ".rgba"
+
+    def _scan_disk(self):
+        entries = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(".rgba"):
+                continue
+            stat = os.stat(os.path.join(self.directory, filename))
+            entries.append((stat.st_mtime, filename, stat.st_size))
+        for _, filename, size in sorted(entries):
+            self._disk[filename] = size
+
+    async def _store_disk(self, key: str, avatar: bytes):
+        filename = self._filename(key)
+        path = os.path.join(self.directory, filename)
+        if not await http_executor.run(_write_file, path, avatar):
+            return
+        self._disk[filename] = len(avatar)
+        self._disk.move_to_end(filename)
+
+        victims = []
+        while sum(self._disk.values()) > self.max_disk_bytes and len(self._disk) > 1:
+            oldest, _ = self._disk.popitem(last=False)
+            victims.append(os.path.join(self.directory, oldest))
+            self.stats["evictions"] += 1
+        if victims:
+            await http_executor.run(_remove_files, victims)
+
+
+def _read_file(path: str, touch: bool = False) -> bytes | None:
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        if touch:
+            # 更新修改時間，重新啟動後仍能依使用時間淘汰
+            os.utime(path)
+        return data
+    except OSError as e:
+        logger.error(f"讀取圖片 '{path}' 時發生錯誤: {e}")
+        return None
+
+
+def _write_file(path: str, data: bytes) -> bool:
+    try:
+        with open(path + ".part", "wb") as f:
+            f.write(data)
+        os.replace(path + ".part", path)
+        return True
+    except OSError as e:
+        logger.error(f"寫入頭像快取失敗: {e}")
+        return False
+
+
+def _remove_files(paths: list[str]):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def url_key(url: str) -> str:
+    """以不含查詢字串的網址產生快取鍵，附件網址的簽章參數會變動。"""
+    return "url:" + hashlib.sha256(url.split("?", 1)[0].encode("utf-8")).hexdigest()
+
+
+avatar_cache = AvatarCache(
+    directory=AVATAR_CACHE_DIR,
+    max_disk_bytes=AVATAR_CACHE_MAX_BYTES,
+    memory_items=AVATAR_MEMORY_ITEMS,
+)
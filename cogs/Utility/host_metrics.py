@@ -0,0 +1,119 @@
+import asyncio
+import collections
+import logging
+import math
+import os
+import time
+
+import psutil
+from discord.ext import commands
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("Host_Metrics")
+
+# 取樣間隔 (秒) 與每項指標保留的樣本數，預設保留最近 5 分鐘
+METRICS_INTERVAL = float(os.getenv("METRICS_SAMPLE_INTERVAL", "5"))
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", "60"))
+
+
+def percentile(values, percent: float) -> float | None:
+    """以最近排名法計算百分位數，沒有樣本時回傳 None。"""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    rank = max(1, math.ceil(percent / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class HostMetricsSampler:
+    """
+    在背景定期取樣主機與機器人的狀態，保存在固定長度的環狀緩衝區。
+
+    指令只需讀取已取樣的資料，不必在回應前等待 CPU 取樣。
+    """
+
+    def __init__(self, interval: float, window: int):
+        self.interval = interval
+        self.window = window
+        self.process = psutil.Process(os.getpid())
+        self.series: dict[str, collections.deque] = {
+            name: collections.deque(maxlen=window)
+            for name in ("cpu_percent", "rss_mb", "loop_lag_ms", "gateway_ms")
+        }
+        # 伺服器 ID -> 語音延遲 (ms)
+        self.voice: dict[int, collections.deque] = {}
+        self._bot: commands.Bot | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self, bot: commands.Bot):
+        if self._task is not None and not self._task.done():
+            return
+        self._bot = bot
+        # 第一次呼叫只建立基準，之後回傳與上次呼叫之間的平均使用率
+        psutil.cpu_percent(interval=None)
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self, name: str) -> dict | None:
+        """回傳指標的最新值、p50 與 p95，沒有樣本時回傳 None。"""
+        values = self.series.get(name)
+        return _describe(values) if values else None
+
+    def voice_stats(self, guild_id: int) -> dict | None:
+        values = self.voice.get(guild_id)
+        return _describe(values) if values else None
+
+    def summary(self) -> dict:
+        return {
+            "interval": self.interval,
+            "window": self.window,
+            **{name: self.stats(name) for name in self.series},
+            "voice_guilds": len(self.voice),
+        }
+
+    async def _run(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            # 實際醒來的時間比預期晚多少，代表事件迴圈被阻塞的程度
+            lag = max(0.0, time.monotonic() - expected)
+            try:
+                self._sample(lag)
+            except Exception as e:
+                logger.error(f"取樣主機狀態時發生錯誤: {e}")
+
+    def _sample(self, loop_lag: float):
+        self.series["loop_lag_ms"].append(loop_lag * 1000)
+        self.series["cpu_percent"].append(psutil.cpu_percent(interval=None))
+        self.series["rss_mb"].append(self.process.memory_info().rss / 1024**2)
+
+        latency = self._bot.latency
+        if math.isfinite(latency):
+            self.series["gateway_ms"].append(latency * 1000)
+
+        connected = set()
+        for voice_client in self._bot.voice_clients:
+            guild_id = voice_client.guild.id
+            connected.add(guild_id)
+            if math.isfinite(voice_client.latency):
+                self.voice.setdefault(
+                    guild_id, collections.deque(maxlen=self.window)
+                ).append(voice_client.latency * 1000)
+        # 已斷線的伺服器不再保留資料
+        for guild_id in self.voice.keys() - connected:
+            del self.voice[guild_id]
+
+
+def _describe(values) -> dict:
+    return {
+        "last": values[-1],
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+    }
+
+
+host_metrics = HostMetricsSampler(interval=METRICS_INTERVAL, window=METRICS_WINDOW)
@@ -1,344 +1,39 @@
-from datetime import datetime
+import asyncio
 import discord
 from discord import app_commands
 from discord.ext import commands
+from datetime import datetime
 import io
 import logging
 import os
-from PIL import Image, ImageDraw, ImageFont
-import requests
 
-from config import DISCORD_DEFAULT_AVATAR, FONT_PATH, DEFAULT_AVATAR
+from config import DISCORD_DEFAULT_AVATAR, DEFAULT_AVATAR
+from executors import BUSY_MESSAGE, ExecutorBusy, render_executor
+from miq_render import AVATAR_MAX_PIXELS, AVATAR_SIZE, render_quote, render_quotes
+from .avatar_cache import AVATAR_MAX_BYTES, avatar_cache, url_key
+from .quote_cache import quote_cache, quote_key
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("MIQ")
 
-CANVAS_WIDTH, CANVAS_HEIGHT = 1920, 1080  # 圖片寬度, 高度
-TEXT_COLOR = (255, 255, 255)  # 引言文字顏色
-AUTHOR_COLOR = (200, 200, 200)  # 作者文字顏色
-FOOTER_COLOR = (150, 150, 150)  # 底部標記顏色
-LEFT_BG_COLOR = (26, 26, 26, 255)  # 左側背景顏色 RGBA
-RIGHT_BG_COLOR = (26, 26, 26, 255)  # 右側背景顏色 RGBA
-# 蒙板中心位置
-VIGNETTE_MASK_CENTER_X = CANVAS_WIDTH * 0
-VIGNETTE_MASK_CENTER_Y = CANVAS_HEIGHT * 0.5
-VIGNETTE_MASK_RADIUS_PIXELS = 900  # 蒙板大小
-VIGNETTE_GRADIENT_START_RATIO = 0.7  # 蒙板漸變起始處 (0 ~ 1)
-# 字型大小
-QUOTE_FONT_SIZE = 72
-AUTHOR_FONT_SIZE = 45
-HANDLE_FONT_SIZE = 30
-FOOTER_FONT_SIZE = 21
-TEXT_MARGIN_WIDTH = 75  # 文字區域左右邊距
-
-
-def create_black_mask(
-    width: int, height: int, center: tuple, max_radius: int, gradient_start_ratio: float
-):
-    """
-    Args:
-        width (int): 蒙版寬度。
-        height (int): 蒙版高度。
-        center (tuple): 蒙版中心 (x, y)。
-        max_radius (int): 蒙版最大半徑 (漸變結束點)。
-        gradient_start_ratio (float): 漸變起始位置的半徑比例 (0.0 到 1.0)。
-    """
-    center_x, center_y = center
-    gradient_start_radius = int(max_radius * gradient_start_ratio)
-    gradient_width = max_radius - gradient_start_radius
-
-    alpha_mask = Image.new("L", (width, height), 255)
-    draw = ImageDraw.Draw(alpha_mask)
-
-    if gradient_width > 0:
-        for i in range(max_radius, gradient_start_radius, -1):
-            progress_in_gradient = (i - gradient_start_radius) / gradient_width
-            alpha = 255 * progress_in_gradient**1
-            alpha = int(max(0, min(255, alpha)))
-
-            x0, y0 = center_x - i, center_y - i
-            x1, y1 = center_x + i, center_y + i
-            draw.ellipse([x0, y0, x1, y1], fill=alpha)
-
-    if gradient_start_radius > 0:
-        x0_clear = center_x - gradient_start_radius
-        y0_clear = center_y - gradient_start_radius
-        x1_clear = center_x + gradient_start_radius
-        y1_clear = center_y + gradient_start_radius
-        draw.ellipse([x0_clear, y0_clear, x1_clear, y1_clear], fill=0)
-
-    base_image = Image.new("RGBA", (width, height), RIGHT_BG_COLOR)
-    base_image.putalpha(alpha_mask)
-
-    return base_image
-
-
-def image_handler(input_path: str):
-    """
-    從本地路徑或 URL 開啟圖片。
-
-    Args:
-        input_path (str): 圖片的本地檔案路徑或線上 URL。
-
-    Returns:
-        Image.Image: 成功時回傳 Pillow Image 物件 (已轉換為 'RGBA')。
-        None: 發生任何錯誤時回傳 None。
-    """
-    try:
-        if input_path.startswith(("http://", "https://")):
-            logger.info(f"正在從 URL 下載圖片: {input_path}")
-            response = requests.get(input_path, stream=True)
-            response.raise_for_status()
-            image_data = io.BytesIO(response.content)
-            image = Image.open(image_data).convert("RGBA")
-            return image
-        else:
-            logger.info(f"正在讀取本地圖片: {input_path}")
-            image = Image.open(input_path).convert("RGBA")
-            return image
-
-    except FileNotFoundError:
-        logger.error(f"錯誤：找不到指定的本地圖片 '{input_path}'。")
-        return None
-    except requests.exceptions.RequestException as e:
-        logger.error(f"錯誤：下載圖片時發生網路錯誤: {e}")
-        return None
-    except Exception as e:
-        logger.error(f"讀取或處理圖片 '{input_path}' 時發生錯誤: {e}")
-        return None
-
-
-def wrap_text(text, font, max_width, draw_obj):
-    """
-    專為無空格語言（如中文）設計的逐字換行函式。
-    """
-    lines = []
-    if not text:
-        return lines
-
-    current_line = ""
-    for char in text:
-        test_line = current_line + char
-        if draw_obj.textlength(test_line, font=font) <= max_width:
-            current_line = test_line
-        else:
-            lines.append(current_line)
-            current_line = char
-
-    lines.append(current_line)
-    return lines
-
-
-def create_composite_image(
-    input_path: str,
-    canvas_size: tuple,
-    vignette_mask_info: dict,
-):
-    """
-    將輸入圖片放置在畫布上，並應用一個可自訂的暈影效果。
-    """
-    try:
-        user_image = image_handler(input_path)
-    except FileNotFoundError:
-        logger.error(f"錯誤：找不到指定的輸入圖片 '{input_path}'。")
-        return
-    except Exception as e:
-        logger.error(f"讀取圖片時發生錯誤: {e}")
-        return
-
-    canvas_width, canvas_height = canvas_size
-    background_canvas = Image.new("RGBA", canvas_size, LEFT_BG_COLOR)
-
-    orig_w, orig_h = user_image.size
-    crop_size = min(orig_w, orig_h)
-    left = (orig_w - crop_size) // 2
-    top = (orig_h - crop_size) // 2
-    right = (orig_w + crop_size) // 2
-    bottom = (orig_h + crop_size) // 2
-    user_image = user_image.crop((left, top, right, bottom))
-
-    max_w = int(canvas_width * 0.4)
-    max_h = int(canvas_height * 0.8)
-    max_size = min(max_w, max_h)
-    user_image = user_image.resize((max_size, max_size), Image.Resampling.LANCZOS)
-    img_w, img_h = user_image.size
-
-    paste_center_x, paste_center_y = (canvas_width // 4, canvas_height // 2)
-    paste_x = paste_center_x - (img_w // 2)
-    paste_y = paste_center_y - (img_h // 2)
-
-    background_canvas.paste(user_image, (int(paste_x), int(paste_y)), user_image)
-
-    mask_center = vignette_mask_info["center"]
-    mask_radius = vignette_mask_info["radius"]
-    mask_start_ratio = vignette_mask_info["start_ratio"]
-
-    logger.info(f"正在生成蒙版")
-    vignette_mask = create_black_mask(
-        width=canvas_width,
-        height=canvas_height,
-        center=mask_center,
-        max_radius=mask_radius,
-        gradient_start_ratio=mask_start_ratio,
-    )
-    final_image = Image.alpha_composite(background_canvas, vignette_mask)
-    return final_image
-
-
-def create_quote_image(
-    output_path: str,
-    quote_text: str,
-    author_info: str,
-    custom_image_path: str,
-    footer_text: str = None,
-):
-    """
-    根據提供的引言、作者資訊與背景圖片，生成一張語錄圖片並儲存至指定路徑。
-
-    Args:
-        output_path (str): 輸出圖片的檔案路徑。
-        quote_text (str): 引言內容。
-        author_info (str): 作者資訊 (可含名稱與標籤)。
-        custom_image_path (str): 背景圖片的路徑或 URL。
-        footer_text (str, optional): 底部標記文字。預設為 None。
-
-    Returns:
-        None: 若發生錯誤或生成失敗時回傳 None。
-        Any: 成功時無回傳值（即隱式回傳 None），僅將圖片儲存至指定路徑。
-    """
-    mask_settings = {
-        "center": (int(VIGNETTE_MASK_CENTER_X), int(VIGNETTE_MASK_CENTER_Y)),
-        "radius": VIGNETTE_MASK_RADIUS_PIXELS,
-        "start_ratio": VIGNETTE_GRADIENT_START_RATIO,
-    }
-    base_img = create_composite_image(
-        input_path=custom_image_path,
-        canvas_size=(CANVAS_WIDTH, CANVAS_HEIGHT),
-        vignette_mask_info=mask_settings,
-    )
-    if base_img is None:
-        return None
-
-    draw = ImageDraw.Draw(base_img)
-    quote_font = ImageFont.truetype(FONT_PATH, QUOTE_FONT_SIZE)
-    author_font = ImageFont.truetype(FONT_PATH, AUTHOR_FONT_SIZE)
-    handle_font = ImageFont.truetype(FONT_PATH, HANDLE_FONT_SIZE)
-    footer_font = ImageFont.truetype(FONT_PATH, FOOTER_FONT_SIZE)
-
-    text_area_left = CANVAS_WIDTH // 2 + TEXT_MARGIN_WIDTH
-    text_area_width = CANVAS_WIDTH - text_area_left - TEXT_MARGIN_WIDTH
-
-    wrapped_quote_lines = wrap_text(quote_text, quote_font, text_area_width, draw)
-    wrapped_quote_str = "\n".join(wrapped_quote_lines)
-
-    author_name, author_handle = "", ""
-    if author_info:
-        parts = author_info.split("\n", 1)
-        author_name = parts[0].strip()
-        if len(parts) > 1:
-            author_handle = parts[1].strip()
-
-    wrapped_author_name_str = ""
-    if author_name:
-        full_author_name = f"- {author_name}"
-        wrapped_author_name_lines = wrap_text(
-            full_author_name, author_font, text_area_width, draw
+# 向 Discord CDN 要求不小於頭像輸出尺寸的最小尺寸 (2 的冪次)
+AVATAR_CDN_SIZE = min(4096, max(16, 1 << (AVATAR_SIZE - 1).bit_length()))
+# 私訊等沒有伺服器資訊時的上傳大小限制
+DEFAULT_UPLOAD_LIMIT = 10 * 1024**2
+FOOTER_TEXT = "Generated by Norvireon"
+# 右鍵選單可選擇的先前訊息數與單次最多製作的圖片數 (Discord 單則訊息最多 10 個附件)
+BATCH_HISTORY = int(os.getenv("MIQ_BATCH_HISTORY", "15"))
+BATCH_MAX_QUOTES = min(10, int(os.getenv("MIQ_BATCH_MAX_QUOTES", "10")))
+
+
+def member_avatar_source(member: discord.abc.User) -> tuple[str, str]:
+    """回傳成員頭像的快取鍵與下載網址 (或本地檔案路徑)。"""
+    if member.display_avatar:
+        return (
+            f"avatar:{member.display_avatar.key}",
+            member.display_avatar.with_size(AVATAR_CDN_SIZE).url,
         )
-        wrapped_author_name_str = "\n  ".join(wrapped_author_name_lines)
-
-    wrapped_author_handle_str = ""
-    if author_handle:
-        wrapped_author_handle_lines = wrap_text(
-            author_handle, handle_font, text_area_width - 15, draw
-        )
-        wrapped_author_handle_str = "\n".join(wrapped_author_handle_lines)
-
-    quote_height, author_name_height, author_handle_height = 0, 0, 0
-
-    if wrapped_quote_str:
-        quote_bbox = draw.multiline_textbbox(
-            (0, 0), wrapped_quote_str, font=quote_font, spacing=10
-        )
-        quote_height = quote_bbox[3] - quote_bbox[1]
-
-    if wrapped_author_name_str:
-        author_name_bbox = draw.multiline_textbbox(
-            (0, 0), wrapped_author_name_str, font=author_font, spacing=5
-        )
-        author_name_height = author_name_bbox[3] - author_name_bbox[1]
-
-    if wrapped_author_handle_str:
-        author_handle_bbox = draw.multiline_textbbox(
-            (0, 0), wrapped_author_handle_str, font=handle_font, spacing=4
-        )
-        author_handle_height = author_handle_bbox[3] - author_handle_bbox[1]
-
-    gap1, gap2 = 20, 8
-    total_text_height = quote_height
-    if author_name_height > 0:
-        total_text_height += gap1 + author_name_height
-    if author_handle_height > 0:
-        total_text_height += gap2 + author_handle_height
-
-    start_y = (CANVAS_HEIGHT - total_text_height) // 2
-    current_y = float(start_y)
-
-    if wrapped_quote_str:
-        draw.multiline_text(
-            (text_area_left, current_y),
-            wrapped_quote_str,
-            font=quote_font,
-            fill=TEXT_COLOR,
-            spacing=10,
-        )
-        current_y += quote_height + gap1
-
-    if wrapped_author_name_str:
-        draw.multiline_text(
-            (text_area_left, current_y),
-            wrapped_author_name_str,
-            font=author_font,
-            fill=AUTHOR_COLOR,
-            spacing=5,
-        )
-        current_y += author_name_height + gap2
-
-    if wrapped_author_handle_str:
-        draw.multiline_text(
-            (text_area_left + 15, current_y),
-            wrapped_author_handle_str,
-            font=handle_font,
-            fill=AUTHOR_COLOR,
-            spacing=4,
-        )
-
-    if footer_text:
-        display_date = datetime.now().strftime("%Y-%m-%d")
-        right_margin = 30
-        bottom_margin = 30
-        line_spacing = 5
-
-        date_bbox = draw.textbbox((0, 0), display_date, font=footer_font)
-        date_width = date_bbox[2] - date_bbox[0]
-        date_height = date_bbox[3] - date_bbox[1]
-        date_x = CANVAS_WIDTH - date_width - right_margin
-        date_y = CANVAS_HEIGHT - date_height - bottom_margin
-        draw.text((date_x, date_y), display_date, font=footer_font, fill=FOOTER_COLOR)
-
-        footer_bbox = draw.textbbox((0, 0), footer_text, font=footer_font)
-        footer_width = footer_bbox[2] - footer_bbox[0]
-        footer_height = footer_bbox[3] - footer_bbox[1]
-        footer_x = CANVAS_WIDTH - footer_width - right_margin
-        footer_y = date_y - footer_height - line_spacing
-        draw.text(
-            (footer_x, footer_y), footer_text, font=footer_font, fill=FOOTER_COLOR
-        )
-
-    try:
-        base_img.save(output_path, format="PNG")
-    except Exception as e:
-        logger.error(f"儲存圖片 '{output_path}' 時發生錯誤: {e}")
-        return None
+    return f"file:{DISCORD_DEFAULT_AVATAR}", DISCORD_DEFAULT_AVATAR
 
 
 class MIQ:
@@ -369,42 +64,250 @@ class MIQ:
             author_info = "Anonymous"
 
         await itat.response.defer(thinking=True)
-        output_filename = f"quote_{itat.id}.png"
 
         image_url = ""
         if custom_avatar:
-            if custom_avatar.content_type and "image" in custom_avatar.content_type:
-                image_url = custom_avatar.url
-            else:
+            if not (
+                custom_avatar.content_type and "image" in custom_avatar.content_type
+            ):
                 await itat.followup.send(
                     "請上傳有效的圖片檔案 (例如 .png, .jpg)。", ephemeral=True
                 )
                 return
+            # 在下載與解碼前先以附件資訊擋下過大的圖片
+            if custom_avatar.size > AVATAR_MAX_BYTES or (
+                (custom_avatar.width or 0) * (custom_avatar.height or 0)
+                > AVATAR_MAX_PIXELS
+            ):
+                await itat.followup.send(
+                    "圖片檔案過大，請上傳較小的圖片。", ephemeral=True
+                )
+                return
+            image_url = custom_avatar.url
+            avatar_key = url_key(custom_avatar.url)
         elif author_member:
-            image_url = (
-                author_member.display_avatar.url
-                if author_member.display_avatar
-                else DISCORD_DEFAULT_AVATAR
-            )
+            avatar_key, image_url = member_avatar_source(author_member)
         else:
             image_url = DEFAULT_AVATAR
+            avatar_key = f"file:{DEFAULT_AVATAR}"
 
         try:
-            create_quote_image(
-                quote_text=quote_context,
-                author_info=author_info,
-                custom_image_path=image_url,
-                footer_text=f"Generated by Norvireon",
-                output_path=output_filename,
+            avatar_rgba = await avatar_cache.get_avatar(avatar_key, image_url)
+            if avatar_rgba is None:
+                await itat.followup.send("無法讀取頭像圖片", ephemeral=True)
+                return
+
+            upload_limit = (
+                itat.guild.filesize_limit if itat.guild else DEFAULT_UPLOAD_LIMIT
+            )
+            footer_text = FOOTER_TEXT
+            display_date = datetime.now().strftime("%Y-%m-%d")
+            cache_key = quote_key(
+                quote_context,
+                author_info,
+                avatar_rgba,
+                footer_text,
+                display_date,
+                upload_limit,
             )
+            result = quote_cache.get(cache_key)
+            if result is None:
+                result = await render_executor.run(
+                    render_quote,
+                    quote_text=quote_context,
+                    author_info=author_info,
+                    avatar_rgba=avatar_rgba,
+                    footer_text=footer_text,
+                    max_bytes=upload_limit,
+                    display_date=display_date,
+                )
+                if result is None:
+                    await itat.followup.send("製作語錄圖片時發生錯誤", ephemeral=True)
+                    return
+                quote_cache.put(cache_key, result)
+                logger.info(
+                    f"語錄圖片編碼完成: {result['format']}, "
+                    f"{result['size'] / 1024:.0f} KB, "
+                    f"{result['encode_seconds'] * 1000:.0f} ms"
+                )
+            if result["size"] > upload_limit:
+                await itat.followup.send("語錄圖片超過上傳大小限制", ephemeral=True)
+                return
 
             await itat.followup.send(
-                file=discord.File(output_filename, filename="quote.png")
+                file=discord.File(
+                    io.BytesIO(result["data"]),
+                    filename=f"quote.{result['extension']}",
+                )
             )
 
+        except ExecutorBusy:
+            await itat.followup.send(BUSY_MESSAGE, ephemeral=True)
         except Exception as e:
             logger.error(f"執行 miq 指令時發生未預期錯誤: {e}")
             await itat.followup.send("執行指令時發生內部錯誤", ephemeral=True)
-        finally:
-            if os.path.exists(output_filename):
-                os.remove(output_filename)
+
+    async def quote_messages(self, itat: discord.Interaction, message: discord.Message):
+        """訊息右鍵選單：選擇這則與先前的訊息，一次製作多張語錄圖片。"""
+        await itat.response.defer(ephemeral=True, thinking=True)
+
+        try:
+            history = [
+                m
+                async for m in message.channel.history(
+                    limit=BATCH_HISTORY, before=message
+                )
+            ]
+        except discord.HTTPException as e:
+            logger.warning(f"無法讀取訊息紀錄，只使用選取的訊息: {e}")
+            history = []
+        candidates = [m for m in reversed(history) if m.clean_content]
+        if message.clean_content:
+            candidates.append(message)
+        if not candidates:
+            await itat.followup.send("沒有可以製作語錄的文字訊息", ephemeral=True)
+            return
+
+        if len(candidates) == 1:
+            # 第一則後續訊息會取代延遲回應而同樣只有自己看得到，圖片需另外送出
+            await itat.followup.send("製作中...", ephemeral=True)
+            selected = candidates
+        else:
+            selected = await self._select_messages(itat, candidates, message)
+            if not selected:
+                return
+        await self._send_quote_batch(itat, selected)
+
+    async def _select_messages(
+        self,
+        itat: discord.Interaction,
+        candidates: list[discord.Message],
+        target: discord.Message,
+    ) -> list[discord.Message] | None:
+        options = [
+            discord.SelectOption(
+                label=f"{m.author.display_name}: {m.clean_content}"[:100],
+                description=m.created_at.astimezone().strftime("%Y-%m-%d %H:%M"),
+                value=str(m.id),
+                default=m.id == target.id,
+            )
+            for m in candidates
+        ]
+        message_menu = discord.ui.Select(
+            placeholder="選擇要製作語錄的訊息",
+            options=options,
+            min_values=1,
+            max_values=min(len(options), BATCH_MAX_QUOTES),
+        )
+        view = discord.ui.View(timeout=60)
+        view.add_item(message_menu)
+        future = asyncio.get_running_loop().create_future()
+
+        async def on_timeout():
+            if not future.done():
+                future.set_result(None)
+            await original_message.edit(content="選擇已超時，請重新操作。", view=None)
+
+        view.on_timeout = on_timeout
+
+        async def message_menu_callback(s_itat: discord.Interaction):
+            view.stop()
+            await s_itat.response.edit_message(content="製作中...", view=None)
+            if not future.done():
+                future.set_result(message_menu.values)
+
+        message_menu.callback = message_menu_callback
+
+        original_message = await itat.followup.send(
+            content="請選擇要製作語錄的訊息", view=view, ephemeral=True
+        )
+        values = await future
+        if values is None:
+            return None
+        by_id = {str(m.id): m for m in candidates}
+        return sorted((by_id[v] for v in values), key=lambda m: m.created_at)
+
+    async def _send_quote_batch(
+        self, itat: discord.Interaction, messages: list[discord.Message]
+    ):
+        """同時取得所有作者的頭像，並在一次渲染工作中製作所有圖片。"""
+        quotes = []
+        sources = {}
+        for message in messages:
+            author = message.author
+            avatar_key, image_url = member_avatar_source(author)
+            sources[avatar_key] = image_url
+            quotes.append(
+                {
+                    "quote_text": message.clean_content,
+                    "author_info": f"{author.display_name}\n"
+                    f"{author.global_name or author.name}",
+                    "avatar_key": avatar_key,
+                }
+            )
+
+        try:
+            loaded = await asyncio.gather(
+                *(avatar_cache.get_avatar(k, url) for k, url in sources.items())
+            )
+            avatars = {k: a for k, a in zip(sources, loaded) if a is not None}
+            quotes = [q for q in quotes if q["avatar_key"] in avatars]
+            if not quotes:
+                await itat.followup.send("無法讀取頭像圖片", ephemeral=True)
+                return
+
+            # 上傳限制以整則訊息計算，平均分配給每張圖片
+            upload_limit = (
+                itat.guild.filesize_limit if itat.guild else DEFAULT_UPLOAD_LIMIT
+            ) // len(quotes)
+            display_date = datetime.now().strftime("%Y-%m-%d")
+            cache_keys = [
+                quote_key(
+                    q["quote_text"],
+                    q["author_info"],
+                    avatars[q["avatar_key"]],
+                    FOOTER_TEXT,
+                    display_date,
+                    upload_limit,
+                )
+                for q in quotes
+            ]
+            results = [quote_cache.get(key) for key in cache_keys]
+            missing = [i for i, result in enumerate(results) if result is None]
+            if missing:
+                pending = [quotes[i] for i in missing]
+                rendered = await render_executor.run(
+                    render_quotes,
+                    pending,
+                    {q["avatar_key"]: avatars[q["avatar_key"]] for q in pending},
+                    footer_text=FOOTER_TEXT,
+                    max_bytes=upload_limit,
+                    display_date=display_date,
+                )
+                for i, result in zip(missing, rendered):
+                    results[i] = result
+                    if result is not None:
+                        quote_cache.put(cache_keys[i], result)
+                logger.info(
+                    f"批次製作 {len(pending)} 張語錄圖片 "
+                    f"(快取命中 {len(quotes) - len(pending)} 張)"
+                )
+
+            files = [
+                discord.File(
+                    io.BytesIO(result["data"]),
+                    filename=f"quote_{n}.{result['extension']}",
+                )
+                for n, result in enumerate(results, 1)
+                if result is not None and result["size"] <= upload_limit
+            ]
+            if not files:
+                await itat.followup.send("製作語錄圖片時發生錯誤", ephemeral=True)
+                return
+            await itat.followup.send(files=files)
+
+        except ExecutorBusy:
+            await itat.followup.send(BUSY_MESSAGE, ephemeral=True)
+        except Exception as e:
+            logger.error(f"批次製作語錄圖片時發生未預期錯誤: {e}")
+            await itat.followup.send("執行指令時發生內部錯誤", ephemeral=True)
@@ -2,17 +2,19 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 
-import asyncio
 import datetime
-import os
 import psutil
 import time
 
+from executors import get_executor_stats
+from .avatar_cache import avatar_cache
+from .host_metrics import host_metrics
+from .quote_cache import quote_cache
+
 
 class PingCommands:
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.process = psutil.Process(os.getpid())
 
     def get_latency_color(self, latency_ms: float) -> discord.Color:
         if latency_ms < 80:
@@ -38,6 +40,15 @@ class PingCommands:
 
         return " ".join(parts)
 
+    def format_stats(self, stats: dict | None, unit: str, digits: int = 1) -> str:
+        """以最新值與 p50/p95 顯示取樣結果。"""
+        if stats is None:
+            return "N/A"
+        return (
+            f"{stats['last']:.{digits}f}{unit} "
+            f"(p50 {stats['p50']:.{digits}f} / p95 {stats['p95']:.{digits}f})"
+        )
+
     @app_commands.command(name="ping", description="顯示機器人與伺服器的即時狀態")
     async def ping(self, itat: discord.Interaction):
         start_time = time.monotonic()
@@ -45,24 +56,23 @@ class PingCommands:
         end_time = time.monotonic()
         msg_latency = (end_time - start_time) * 1000
 
+        # 取樣資料由背景的 host_metrics 收集，這裡不做任何阻塞的量測
         api_latency = self.bot.latency * 1000
-        voice_latency = (
-            itat.guild.voice_client.latency * 1000
+        gateway_stats = host_metrics.stats("gateway_ms")
+        voice_stats = (
+            host_metrics.voice_stats(itat.guild.id)
             if itat.guild and itat.guild.voice_client
             else None
         )
 
-        server_cpu_usage = await asyncio.to_thread(psutil.cpu_percent, interval=1)
-
         server_memory = psutil.virtual_memory()
         server_memory_used_gb = server_memory.used / (1024**3)
         server_memory_total_gb = server_memory.total / (1024**3)
         server_memory_percent = server_memory.percent
 
-        bot_memory_usage_mb = self.process.memory_info().rss / (1024**2)
-
+        now = datetime.datetime.now(datetime.timezone.utc)
         uptime = (
-            self.format_uptime(datetime.datetime.utcnow() - self.bot.start_time)
+            self.format_uptime(now - self.bot.start_time)
             if hasattr(self.bot, "start_time")
             else "N/A"
         )
@@ -71,31 +81,49 @@ class PingCommands:
         embed = discord.Embed(
             title="機器人與主機狀態報告",
             color=embed_color,
-            timestamp=datetime.datetime.utcnow(),
+            timestamp=now,
         )
 
         latency_info = (
-            f"**API 延遲:** `{api_latency:.2f} ms`\n"
-            f"**訊息來回:** `{msg_latency:.2f} ms`"
+            f"**API 延遲:** `{self.format_stats(gateway_stats, ' ms')}`\n"
+            f"**訊息來回:** `{msg_latency:.2f} ms`\n"
+            f"**事件迴圈:** `{self.format_stats(host_metrics.stats('loop_lag_ms'), ' ms')}`"
         )
-        if voice_latency is not None:
-            latency_info += f"\n**語音延遲:** `{voice_latency:.2f} ms`"
+        if voice_stats is not None:
+            latency_info += f"\n**語音延遲:** `{self.format_stats(voice_stats, ' ms')}`"
         embed.add_field(name="網路延遲", value=latency_info, inline=True)
 
         host_info = (
-            f"**CPU 總負載:** `{server_cpu_usage:.1f}%`\n"
+            f"**CPU 總負載:** `{self.format_stats(host_metrics.stats('cpu_percent'), '%')}`\n"
             f"**記憶體用量:** `{server_memory_used_gb:.2f} / {server_memory_total_gb:.2f} GB` (`{server_memory_percent}%)`"
         )
         embed.add_field(name="伺服器主機狀態", value=host_info, inline=True)
 
         bot_info = (
-            f"**程序記憶體:** `{bot_memory_usage_mb:.2f} MB`\n"
+            f"**程序記憶體:** `{self.format_stats(host_metrics.stats('rss_mb'), ' MB')}`\n"
             f"**已運行時間:** `{uptime}`"
         )
         embed.add_field(name="機器人自身狀態", value=bot_info, inline=False)
 
+        executor_info = "\n".join(
+            f"**{stats['name']}:** `{stats['running']}/{stats['max_workers']} 執行中, "
+            f"{stats['queued']} 排隊, 使用率 {stats['utilization']:.0%}`"
+            for stats in get_executor_stats()
+        )
+        embed.add_field(name="執行緒池", value=executor_info, inline=True)
+
+        avatar_stats = avatar_cache.summary()
+        quote_stats = quote_cache.summary()
+        cache_info = (
+            f"**頭像:** `{avatar_stats['memory_hits'] + avatar_stats['disk_hits']} 命中 / "
+            f"{avatar_stats['misses']} 未命中`\n"
+            f"**語錄圖片:** `{quote_stats['hits']} 命中 / {quote_stats['misses']} 未命中`"
+        )
+        embed.add_field(name="快取", value=cache_info, inline=True)
+
         embed.set_footer(
-            text=f"由 {itat.user.display_name} 請求",
+            text=f"由 {itat.user.display_name} 請求 · "
+            f"取樣間隔 {host_metrics.interval:g} 秒，最近 {host_metrics.window} 筆",
             icon_url=itat.user.avatar.url if itat.user.avatar else None,
         )
 
@@ -0,0 +1,94 @@
+import collections
+import hashlib
+import logging
+import os
+
+from miq_render import get_render_settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("Quote_Cache")
+
+# 成品圖片快取的總大小上限，設為 0 則停用
+QUOTE_CACHE_MAX_BYTES = int(os.getenv("MIQ_QUOTE_CACHE_MAX_BYTES", str(64 * 1024**2)))
+
+
+class QuoteCache:
+    """
+    已編碼的語錄圖片快取。
+
+    相同內容重新執行指令時直接回傳先前的結果，不必再交給渲染行程。
+    以總位元組數為上限，超過時淘汰最久未使用的圖片。
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._entries: collections.OrderedDict[str, dict] = collections.OrderedDict()
+        self._bytes = 0
+
+    def get(self, key: str) -> dict | None:
+        result = self._entries.get(key)
+        if result is None:
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return result
+
+    def put(self, key: str, result: dict):
+        """
+        儲存 `render_quote` 的結果。
+
+        :param result: 含有 `data` 與 `size` 的輸出結果。
+        """
+        if result["size"] > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old["size"]
+        self._entries[key] = result
+        self._bytes += result["size"]
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted["size"]
+            self.stats["evictions"] += 1
+
+    def summary(self) -> dict:
+        return {
+            "items": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            **self.stats,
+        }
+
+
+def quote_key(
+    quote_text: str,
+    author_info: str,
+    avatar_rgba: bytes,
+    footer_text: str | None,
+    display_date: str,
+    max_bytes: int,
+) -> str:
+    """
+    以所有會影響輸出的內容產生快取鍵。
+
+    頭像以像素內容的雜湊表示，同一張圖片不論來源都能命中；
+    日期也包含在內，跨日後會重新渲染。
+    """
+    digest = hashlib.sha256()
+    for part in (
+        quote_text,
+        author_info,
+        hashlib.sha256(avatar_rgba).hexdigest(),
+        footer_text or "",
+        display_date,
+        str(max_bytes),
+        repr(get_render_settings()),
+    ):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+quote_cache = QuoteCache(max_bytes=QUOTE_CACHE_MAX_BYTES)
@@ -0,0 +1,203 @@
+# executors.py
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("Executors")
+
+# 工作遭拒絕時回覆使用者的訊息
+BUSY_MESSAGE = "系統忙碌中，請稍後再試。"
+
+
+class ExecutorBusy(Exception):
+    """執行緒池的排隊工作已達上限，呼叫端應告知使用者稍後再試。"""
+
+    def __init__(self, name: str):
+        super().__init__(f"Executor '{name}' is busy")
+        self.name = name
+
+
+class BoundedExecutor:
+    """
+    具名且有排隊上限的執行緒池。
+
+    不同類型的阻塞工作使用各自的執行緒池，避免大量解析工作佔滿執行緒，
+    導致資料庫查詢或其他指令跟著卡住。排隊工作超過上限時直接拒絕。
+    """
+
+    def __init__(
+        self, name: str, max_workers: int, max_queue: int, processes: bool = False
+    ):
+        """
+        :param name: 執行緒池名稱，用於日誌與統計。
+        :param max_workers: 同時執行的工作數。
+        :param max_queue: 所有執行緒忙碌時，最多可排隊等待的工作數。
+        :param processes: 改用子行程執行 CPU 密集工作，函式與參數必須可以 pickle。
+        """
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.processes = processes
+        self.stats = {"completed": 0, "failed": 0, "rejected": 0}
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._busy_seconds = 0.0
+        self._wait_seconds = 0.0
+        self._created = time.monotonic()
+
+    def has_capacity(self) -> bool:
+        """是否還有閒置的執行緒，可用於決定是否執行非必要的背景工作。"""
+        return self._pending < self.max_workers
+
+    def is_idle(self) -> bool:
+        """是否沒有任何執行中或排隊中的工作。"""
+        return self._pending == 0
+
+    async def run(self, func, *args, **kwargs):
+        """
+        在執行緒池中執行 `func` 並等待結果。
+
+        :raises ExecutorBusy: 排隊中的工作已達上限。
+        """
+        if self._pending >= self.max_workers + self.max_queue:
+            self.stats["rejected"] += 1
+            logger.warning(f"{self.name} 工作佇列已滿，拒絕新的工作")
+            raise ExecutorBusy(self.name)
+
+        submitted = time.monotonic()
+        if self.processes:
+            # 子行程無法回報開始時間，以送出到完成的時間計算忙碌時間
+            call = functools.partial(func, *args, **kwargs)
+        else:
+            call = functools.partial(self._call, func, args, kwargs, submitted)
+
+        with self._lock:
+            self._pending += 1
+        executor = self._get_executor()
+        try:
+            future = executor.submit(call)
+        except Exception as e:
+            self._finished(submitted, None)
+            if isinstance(e, concurrent.futures.BrokenExecutor):
+                self._broken(executor)
+            raise
+        # 名額在工作實際結束時才歸還；等待的協程被取消時，已開始的工作仍會佔用執行緒
+        future.add_done_callback(functools.partial(self._finished, submitted))
+        try:
+            return await asyncio.wrap_future(future)
+        except concurrent.futures.BrokenExecutor:
+            self._broken(executor)
+            raise
+
+    def summary(self) -> dict:
+        """回傳執行緒池的使用率與排隊狀態。"""
+        elapsed = time.monotonic() - self._created
+        finished = self.stats["completed"] + self.stats["failed"]
+        running = (
+            min(self._pending, self.max_workers) if self.processes else self._running
+        )
+        return {
+            "name": self.name,
+            "max_workers": self.max_workers,
+            "running": running,
+            "queued": max(0, self._pending - running),
+            "max_queue": self.max_queue,
+            "utilization": (
+                min(1.0, self._busy_seconds / (elapsed * self.max_workers))
+                if elapsed
+                else 0.0
+            ),
+            "average_wait_ms": (
+                self._wait_seconds / finished * 1000 if finished else 0.0
+            ),
+            **self.stats,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _finished(self, submitted: float, future: concurrent.futures.Future | None):
+        # 可能在工作執行緒或執行池的管理執行緒中呼叫
+        with self._lock:
+            self._pending -= 1
+            if self.processes:
+                self._busy_seconds += time.monotonic() - submitted
+            if future is None or future.cancelled() or future.exception() is not None:
+                self.stats["failed"] += 1
+            else:
+                self.stats["completed"] += 1
+
+    def _broken(self, executor: concurrent.futures.Executor):
+        # 子行程異常結束後整個池無法再使用，下次呼叫時重新建立
+        if self._executor is executor:
+            logger.error(f"{self.name} 執行池已損毀，將重新建立")
+            self.shutdown()
+
+    def _get_executor(self) -> concurrent.futures.Executor:
+        # 第一次使用時才建立，避免啟動時就產生子行程
+        if self._executor is None:
+            if self.processes:
+                # 事件迴圈與其他執行緒已在執行，fork 並不安全
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            else:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix=f"{self.name}-worker",
+                )
+        return self._executor
+
+    def _call(self, func, args, kwargs, submitted: float):
+        started = time.monotonic()
+        with self._lock:
+            self._running += 1
+            self._wait_seconds += started - submitted
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._busy_seconds += time.monotonic() - started
+
+
+def _pool_size(name: str, workers: int, queue: int) -> tuple[int, int]:
+    prefix = f"EXECUTOR_{name.upper()}"
+    return (
+        int(os.getenv(f"{prefix}_WORKERS", str(workers))),
+        int(os.getenv(f"{prefix}_QUEUE", str(queue))),
+    )
+
+
+# yt-dlp 解析，單次可能耗時數秒
+extract_executor = BoundedExecutor("extract", *_pool_size("extract", 4, 16))
+# 外部 API、HTTP 請求與本地檔案讀寫
+http_executor = BoundedExecutor("http", *_pool_size("http", 8, 32))
+# MongoDB 查詢
+db_executor = BoundedExecutor("db", *_pool_size("db", 8, 64))
+# 圖片繪製等 CPU 密集工作，在子行程中執行以免佔用事件迴圈的 GIL
+render_executor = BoundedExecutor(
+    "render",
+    *_pool_size("render", max(1, (os.cpu_count() or 1) // 2), 4),
+    processes=True,
+)
+
+executors = {
+    executor.name: executor
+    for executor in (extract_executor, http_executor, db_executor, render_executor)
+}
+
+
+def get_executor_stats() -> list[dict]:
+    return [executor.summary() for executor in executors.values()]
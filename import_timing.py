@@ -0,0 +1,38 @@
+# import_timing.py
+import importlib
+import logging
+import sys
+import time
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("Import_Timing")
+
+# 模組名稱 -> 匯入耗時 (秒)
+import_times: dict[str, float] = {}
+
+
+def lazy_import(name: str):
+    """
+    第一次使用時才匯入較重的模組，並記錄匯入耗時。
+
+    :param name: 模組名稱，例如 `yt_dlp` 或 `PIL.Image`。
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    elapsed = time.perf_counter() - started
+    import_times[name] = elapsed
+    logger.info(f"Imported {name} on first use ({elapsed * 1000:.0f} ms)")
+    return module
+
+
+def record(name: str, elapsed: float):
+    """記錄在其他地方量測的載入耗時，例如擴充套件的載入時間。"""
+    import_times[name] = elapsed
+
+
+def get_import_times() -> list[tuple[str, float]]:
+    """依耗時由高到低回傳所有量測結果。"""
+    return sorted(import_times.items(), key=lambda item: item[1], reverse=True)
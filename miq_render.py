@@ -0,0 +1,594 @@
+from datetime import datetime
+import functools
+import io
+import logging
+import os
+import time
+
+from config import FONT_PATH
+from import_timing import lazy_import
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("MIQ_Render")
+
+CANVAS_WIDTH, CANVAS_HEIGHT = 1920, 1080  # 圖片寬度, 高度
+TEXT_COLOR = (255, 255, 255)  # 引言文字顏色
+AUTHOR_COLOR = (200, 200, 200)  # 作者文字顏色
+FOOTER_COLOR = (150, 150, 150)  # 底部標記顏色
+LEFT_BG_COLOR = (26, 26, 26, 255)  # 左側背景顏色 RGBA
+RIGHT_BG_COLOR = (26, 26, 26, 255)  # 右側背景顏色 RGBA
+# 蒙板中心位置
+VIGNETTE_MASK_CENTER_X = CANVAS_WIDTH * 0
+VIGNETTE_MASK_CENTER_Y = CANVAS_HEIGHT * 0.5
+VIGNETTE_MASK_RADIUS_PIXELS = 900  # 蒙板大小
+VIGNETTE_GRADIENT_START_RATIO = 0.7  # 蒙板漸變起始處 (0 ~ 1)
+# 字型大小
+QUOTE_FONT_SIZE = 72
+AUTHOR_FONT_SIZE = 45
+HANDLE_FONT_SIZE = 30
+FOOTER_FONT_SIZE = 21
+TEXT_MARGIN_WIDTH = 75  # 文字區域左右邊距
+
+
+def get_avatar_size(canvas_size: tuple) -> int:
+    """頭像在畫布上的邊長。"""
+    canvas_width, canvas_height = canvas_size
+    return min(int(canvas_width * 0.4), int(canvas_height * 0.8))
+
+
+AVATAR_SIZE = get_avatar_size((CANVAS_WIDTH, CANVAS_HEIGHT))
+# 超過此像素數的圖片在完整解碼前就拒絕
+AVATAR_MAX_PIXELS = int(os.getenv("MIQ_AVATAR_MAX_PIXELS", str(25_000_000)))
+
+# 輸出格式 (png / webp / jpeg) 與各格式的壓縮設定
+OUTPUT_FORMAT = os.getenv("MIQ_OUTPUT_FORMAT", "png").lower()
+PNG_COMPRESS_LEVEL = int(os.getenv("MIQ_PNG_COMPRESS_LEVEL", "1"))
+WEBP_QUALITY = int(os.getenv("MIQ_WEBP_QUALITY", "90"))
+WEBP_METHOD = int(os.getenv("MIQ_WEBP_METHOD", "4"))
+JPEG_QUALITY = int(os.getenv("MIQ_JPEG_QUALITY", "90"))
+# 輸出超過上傳限制時，依序改用的格式
+FALLBACK_FORMATS = ("webp", "jpeg")
+OUTPUT_EXTENSIONS = {"png": "png", "webp": "webp", "jpeg": "jpg"}
+
+
+def create_black_mask(
+    width: int, height: int, center: tuple, max_radius: int, gradient_start_ratio: float
+):
+    """
+    取得暈影蒙版圖層，相同參數只會計算一次。
+
+    回傳的圖層為共用快取，只能用於合成，不可直接修改。
+
+    Args:
+        width (int): 蒙版寬度。
+        height (int): 蒙版高度。
+        center (tuple): 蒙版中心 (x, y)。
+        max_radius (int): 蒙版最大半徑 (漸變結束點)。
+        gradient_start_ratio (float): 漸變起始位置的半徑比例 (0.0 到 1.0)。
+    """
+    return _build_black_mask(
+        width, height, tuple(center), max_radius, gradient_start_ratio, RIGHT_BG_COLOR
+    )
+
+
+@functools.lru_cache(maxsize=4)
+def _build_black_mask(
+    width: int,
+    height: int,
+    center: tuple,
+    max_radius: int,
+    gradient_start_ratio: float,
+    color: tuple,
+):
+    Image = lazy_import("PIL.Image")
+    ImageMath = lazy_import("PIL.ImageMath")
+
+    logger.info(f"正在生成蒙版 ({width}x{height})")
+    center_x, center_y = center
+    gradient_start_radius = int(max_radius * gradient_start_ratio)
+    gradient_width = max_radius - gradient_start_radius
+
+    # 以每個像素到中心的距離計算透明度，取代逐圈繪製同心圓
+    x = Image.new("F", (width, 1))
+    x.putdata([float(i - center_x) for i in range(width)])
+    x = x.resize((width, height), Image.Resampling.NEAREST)
+    y = Image.new("F", (1, height))
+    y.putdata([float(j - center_y) for j in range(height)])
+    y = y.resize((width, height), Image.Resampling.NEAREST)
+
+    if gradient_width > 0:
+        scale = 255.0 / gradient_width
+        alpha_mask = ImageMath.lambda_eval(
+            lambda args: args["min"](
+                args["max"](
+                    (
+                        (args["x"] * args["x"] + args["y"] * args["y"]) ** 0.5
+                        - gradient_start_radius
+                    )
+                    * scale,
+                    0.0,
+                ),
+                255.0,
+            ),
+            x=x,
+            y=y,
+        )
+    else:
+        alpha_mask = ImageMath.lambda_eval(
+            lambda args: (
+                (args["x"] * args["x"] + args["y"] * args["y"]) ** 0.5
+                > gradient_start_radius
+            )
+            * 255.0,
+            x=x,
+            y=y,
+        )
+
+    base_image = Image.new("RGBA", (width, height), color)
+    base_image.putalpha(alpha_mask.convert("L"))
+    return base_image
+
+
+def _record_stage(timings: dict | None, stage: str, started: float) -> float:
+    """累計各階段耗時 (秒)，回傳目前時間作為下一階段的起點。"""
+    now = time.perf_counter()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + now - started
+    return now
+
+
+def prepare_avatar(
+    image_bytes: bytes, size: int = AVATAR_SIZE, timings: dict = None
+) -> bytes | None:
+    """
+    將頭像圖片解碼、裁切為置中正方形並縮放，回傳 RGBA 像素資料。
+
+    結果可以直接快取，之後繪製時不需要再解碼圖片。
+
+    Args:
+        image_bytes (bytes): 頭像圖片檔案的內容。
+        size (int): 輸出邊長。
+        timings (dict, optional): 記錄 `decode` 與 `resize` 階段的耗時。
+
+    Returns:
+        bytes: 成功時回傳 `size` x `size` 的 RGBA 像素資料。
+        None: 發生任何錯誤時回傳 None。
+    """
+    Image = lazy_import("PIL.Image")
+    started = time.perf_counter()
+
+    try:
+        user_image = Image.open(io.BytesIO(image_bytes))
+        orig_w, orig_h = user_image.size
+        if orig_w * orig_h > AVATAR_MAX_PIXELS:
+            logger.warning(f"頭像尺寸過大，拒絕處理: {orig_w}x{orig_h}")
+            return None
+        # JPEG 直接以較小的比例解碼，只要短邊仍不小於輸出尺寸
+        if user_image.format == "JPEG":
+            user_image.draft("RGB", (size, size))
+        user_image = user_image.convert("RGBA")
+    except Exception as e:
+        logger.error(f"讀取或處理圖片時發生錯誤: {e}")
+        return None
+    started = _record_stage(timings, "decode", started)
+
+    # 遠大於輸出尺寸的圖片先以整數倍縮小，減少 LANCZOS 的運算量
+    factor = min(user_image.size) // (size * 2)
+    if factor >= 2:
+        user_image = user_image.reduce(factor)
+
+    orig_w, orig_h = user_image.size
+    crop_size = min(orig_w, orig_h)
+    left = (orig_w - crop_size) // 2
+    top = (orig_h - crop_size) // 2
+    right = (orig_w + crop_size) // 2
+    bottom = (orig_h + crop_size) // 2
+    user_image = user_image.crop((left, top, right, bottom))
+    user_image = user_image.resize((size, size), Image.Resampling.LANCZOS)
+    avatar = user_image.tobytes()
+    _record_stage(timings, "resize", started)
+    return avatar
+
+
+@functools.lru_cache(maxsize=16)
+def get_font(path: str, size: int):
+    """載入字型並快取，同一個字型檔與大小只會讀取一次。"""
+    ImageFont = lazy_import("PIL.ImageFont")
+    return ImageFont.truetype(path, size)
+
+
+# (字型檔, 大小) -> {字元: 寬度}
+_glyph_advances: dict[tuple, dict[str, float]] = {}
+
+
+def _glyph_advance(font, char: str) -> float:
+    advances = _glyph_advances.setdefault((font.path, font.size), {})
+    advance = advances.get(char)
+    if advance is None:
+        advance = advances[char] = font.getlength(char)
+    return advance
+
+
+def wrap_text(text, font, max_width, draw_obj):
+    """
+    專為無空格語言（如中文）設計的逐字換行函式。
+
+    先以快取的單字寬度估計每行的斷點，再用實際排版寬度微調，
+    結果與逐字量測整行寬度相同，但每行只需量測少數幾次。
+    """
+    lines = []
+    if not text:
+        return lines
+
+    # 與逐字量測相同：每行從上一行放不下的字開始，第一行從空字串開始
+    start, end = 0, 0
+    while end < len(text):
+        width = sum(_glyph_advance(font, char) for char in text[start:end])
+        fit = end
+        while fit < len(text):
+            width += _glyph_advance(font, text[fit])
+            if width > max_width:
+                break
+            fit += 1
+
+        while fit > end and draw_obj.textlength(text[start:fit], font=font) > max_width:
+            fit -= 1
+        while (
+            fit < len(text)
+            and draw_obj.textlength(text[start : fit + 1], font=font) <= max_width
+        ):
+            fit += 1
+
+        if fit >= len(text):
+            end = fit
+            break
+        lines.append(text[start:fit])
+        start, end = fit, fit + 1
+
+    lines.append(text[start:end])
+    return lines
+
+
+def create_composite_image(
+    avatar_rgba: bytes,
+    canvas_size: tuple,
+    vignette_mask_info: dict,
+):
+    """
+    將已裁切的頭像放置在畫布上，並應用一個可自訂的暈影效果。
+    """
+    Image = lazy_import("PIL.Image")
+
+    canvas_width, canvas_height = canvas_size
+    background_canvas = Image.new("RGBA", canvas_size, LEFT_BG_COLOR)
+
+    avatar_size = get_avatar_size(canvas_size)
+    try:
+        user_image = Image.frombytes("RGBA", (avatar_size, avatar_size), avatar_rgba)
+    except ValueError as e:
+        logger.error(f"頭像像素資料大小不符: {e}")
+        return None
+    img_w, img_h = user_image.size
+
+    paste_center_x, paste_center_y = (canvas_width // 4, canvas_height // 2)
+    paste_x = paste_center_x - (img_w // 2)
+    paste_y = paste_center_y - (img_h // 2)
+
+    background_canvas.paste(user_image, (int(paste_x), int(paste_y)), user_image)
+
+    mask_center = vignette_mask_info["center"]
+    mask_radius = vignette_mask_info["radius"]
+    mask_start_ratio = vignette_mask_info["start_ratio"]
+
+    vignette_mask = create_black_mask(
+        width=canvas_width,
+        height=canvas_height,
+        center=mask_center,
+        max_radius=mask_radius,
+        gradient_start_ratio=mask_start_ratio,
+    )
+    final_image = Image.alpha_composite(background_canvas, vignette_mask)
+    return final_image
+
+
+def get_render_settings() -> tuple:
+    """影響輸出結果的設定，作為成品快取鍵的一部分。"""
+    return (
+        FONT_PATH,
+        OUTPUT_FORMAT,
+        CANVAS_WIDTH,
+        CANVAS_HEIGHT,
+        VIGNETTE_MASK_RADIUS_PIXELS,
+        VIGNETTE_GRADIENT_START_RATIO,
+        PNG_COMPRESS_LEVEL,
+        WEBP_QUALITY,
+        WEBP_METHOD,
+        JPEG_QUALITY,
+    )
+
+
+def encode_image(image, output_format: str) -> tuple[bytes, float]:
+    """
+    將圖片編碼為指定格式，回傳圖片資料與編碼耗時 (秒)。
+
+    :param output_format: `png`、`webp` 或 `jpeg`。
+    :raises ValueError: 不支援的輸出格式。
+    """
+    started = time.perf_counter()
+    output = io.BytesIO()
+    if output_format == "png":
+        image.save(output, format="PNG", compress_level=PNG_COMPRESS_LEVEL)
+    elif output_format == "webp":
+        image.save(output, format="WEBP", quality=WEBP_QUALITY, method=WEBP_METHOD)
+    elif output_format == "jpeg":
+        # JPEG 不支援透明度
+        image.convert("RGB").save(output, format="JPEG", quality=JPEG_QUALITY)
+    else:
+        raise ValueError(f"Unsupported output format: {output_format}")
+    return output.getvalue(), time.perf_counter() - started
+
+
+def render_quote(
+    quote_text: str,
+    author_info: str,
+    avatar_rgba: bytes,
+    footer_text: str = None,
+    output_format: str = OUTPUT_FORMAT,
+    max_bytes: int = None,
+    display_date: str = None,
+    timings: dict = None,
+) -> dict | None:
+    """
+    根據提供的引言、作者資訊與頭像，生成一張語錄圖片。
+
+    只接受與回傳單純的資料，可以在其他行程中執行。
+
+    Args:
+        quote_text (str): 引言內容。
+        author_info (str): 作者資訊 (可含名稱與標籤)。
+        avatar_rgba (bytes): `prepare_avatar` 產生的頭像像素資料。
+        footer_text (str, optional): 底部標記文字。預設為 None。
+        output_format (str, optional): 輸出格式。預設為 `MIQ_OUTPUT_FORMAT`。
+        max_bytes (int, optional): 上傳大小限制，超過時改用 `FALLBACK_FORMATS`。
+        display_date (str, optional): 底部顯示的日期。預設為今天。
+        timings (dict, optional): 記錄 `composite`、`layout`、`draw` 與 `encode`
+            階段的耗時，只有在同一行程中呼叫時才能取得。
+
+    Returns:
+        dict: 成功時回傳 `data` (圖片資料)、`format`、`extension`、
+            `size` (位元組) 與 `encode_seconds`。
+        None: 若發生錯誤或生成失敗時回傳 None。
+    """
+    started = time.perf_counter()
+    base_img = _create_quote_canvas(avatar_rgba)
+    if base_img is None:
+        return None
+    _record_stage(timings, "composite", started)
+
+    _draw_quote(base_img, quote_text, author_info, footer_text, display_date, timings)
+    return _encode_output(base_img, output_format, max_bytes, timings)
+
+
+def render_quotes(
+    quotes: list[dict],
+    avatars: dict[str, bytes],
+    footer_text: str = None,
+    output_format: str = OUTPUT_FORMAT,
+    max_bytes: int = None,
+    display_date: str = None,
+) -> list[dict | None]:
+    """
+    在同一個工作中渲染多張語錄圖片。
+
+    字型與蒙版只載入一次，同一位作者的頭像合成結果也會重複使用，
+    每多一張圖片只需要繪製文字與編碼。
+
+    Args:
+        quotes (list[dict]): 每張圖片的 `quote_text`、`author_info` 與 `avatar_key`。
+        avatars (dict[str, bytes]): `avatar_key` 對應的頭像像素資料。
+        footer_text (str, optional): 底部標記文字。預設為 None。
+        output_format (str, optional): 輸出格式。預設為 `MIQ_OUTPUT_FORMAT`。
+        max_bytes (int, optional): 每張圖片的上傳大小限制。
+        display_date (str, optional): 底部顯示的日期。預設為今天。
+
+    Returns:
+        list: 與 `quotes` 順序相同的輸出結果，失敗的項目為 None。
+    """
+    canvases = {}
+    results = []
+    for quote in quotes:
+        avatar_key = quote["avatar_key"]
+        if avatar_key not in canvases:
+            canvases[avatar_key] = _create_quote_canvas(avatars[avatar_key])
+        canvas = canvases[avatar_key]
+        if canvas is None:
+            results.append(None)
+            continue
+
+        base_img = canvas.copy()
+        _draw_quote(
+            base_img,
+            quote["quote_text"],
+            quote["author_info"],
+            footer_text,
+            display_date,
+        )
+        results.append(_encode_output(base_img, output_format, max_bytes))
+    return results
+
+
+def _create_quote_canvas(avatar_rgba: bytes):
+    mask_settings = {
+        "center": (int(VIGNETTE_MASK_CENTER_X), int(VIGNETTE_MASK_CENTER_Y)),
+        "radius": VIGNETTE_MASK_RADIUS_PIXELS,
+        "start_ratio": VIGNETTE_GRADIENT_START_RATIO,
+    }
+    return create_composite_image(
+        avatar_rgba=avatar_rgba,
+        canvas_size=(CANVAS_WIDTH, CANVAS_HEIGHT),
+        vignette_mask_info=mask_settings,
+    )
+
+
+def _draw_quote(
+    base_img,
+    quote_text: str,
+    author_info: str,
+    footer_text: str | None,
+    display_date: str | None,
+    timings: dict = None,
+):
+    ImageDraw = lazy_import("PIL.ImageDraw")
+    started = time.perf_counter()
+
+    draw = ImageDraw.Draw(base_img)
+    quote_font = get_font(FONT_PATH, QUOTE_FONT_SIZE)
+    author_font = get_font(FONT_PATH, AUTHOR_FONT_SIZE)
+    handle_font = get_font(FONT_PATH, HANDLE_FONT_SIZE)
+    footer_font = get_font(FONT_PATH, FOOTER_FONT_SIZE)
+
+    text_area_left = CANVAS_WIDTH // 2 + TEXT_MARGIN_WIDTH
+    text_area_width = CANVAS_WIDTH - text_area_left - TEXT_MARGIN_WIDTH
+
+    wrapped_quote_lines = wrap_text(quote_text, quote_font, text_area_width, draw)
+    wrapped_quote_str = "\n".join(wrapped_quote_lines)
+
+    author_name, author_handle = "", ""
+    if author_info:
+        parts = author_info.split("\n", 1)
+        author_name = parts[0].strip()
+        if len(parts) > 1:
+            author_handle = parts[1].strip()
+
+    wrapped_author_name_str = ""
+    if author_name:
+        full_author_name = f"- {author_name}"
+        wrapped_author_name_lines = wrap_text(
+            full_author_name, author_font, text_area_width, draw
+        )
+        wrapped_author_name_str = "\n  ".join(wrapped_author_name_lines)
+
+    wrapped_author_handle_str = ""
+    if author_handle:
+        wrapped_author_handle_lines = wrap_text(
+            author_handle, handle_font, text_area_width - 15, draw
+        )
+        wrapped_author_handle_str = "\n".join(wrapped_author_handle_lines)
+
+    quote_height, author_name_height, author_handle_height = 0, 0, 0
+
+    if wrapped_quote_str:
+        quote_bbox = draw.multiline_textbbox(
+            (0, 0), wrapped_quote_str, font=quote_font, spacing=10
+        )
+        quote_height = quote_bbox[3] - quote_bbox[1]
+
+    if wrapped_author_name_str:
+        author_name_bbox = draw.multiline_textbbox(
+            (0, 0), wrapped_author_name_str, font=author_font, spacing=5
+        )
+        author_name_height = author_name_bbox[3] - author_name_bbox[1]
+
+    if wrapped_author_handle_str:
+        author_handle_bbox = draw.multiline_textbbox(
+            (0, 0), wrapped_author_handle_str, font=handle_font, spacing=4
+        )
+        author_handle_height = author_handle_bbox[3] - author_handle_bbox[1]
+
+    gap1, gap2 = 20, 8
+    total_text_height = quote_height
+    if author_name_height > 0:
+        total_text_height += gap1 + author_name_height
+    if author_handle_height > 0:
+        total_text_height += gap2 + author_handle_height
+
+    started = _record_stage(timings, "layout", started)
+
+    start_y = (CANVAS_HEIGHT - total_text_height) // 2
+    current_y = float(start_y)
+
+    if wrapped_quote_str:
+        draw.multiline_text(
+            (text_area_left, current_y),
+            wrapped_quote_str,
+            font=quote_font,
+            fill=TEXT_COLOR,
+            spacing=10,
+        )
+        current_y += quote_height + gap1
+
+    if wrapped_author_name_str:
+        draw.multiline_text(
+            (text_area_left, current_y),
+            wrapped_author_name_str,
+            font=author_font,
+            fill=AUTHOR_COLOR,
+            spacing=5,
+        )
+        current_y += author_name_height + gap2
+
+    if wrapped_author_handle_str:
+        draw.multiline_text(
+            (text_area_left + 15, current_y),
+            wrapped_author_handle_str,
+            font=handle_font,
+            fill=AUTHOR_COLOR,
+            spacing=4,
+        )
+
+    if footer_text:
+        display_date = display_date or datetime.now().strftime("%Y-%m-%d")
+        right_margin = 30
+        bottom_margin = 30
+        line_spacing = 5
+
+        date_bbox = draw.textbbox((0, 0), display_date, font=footer_font)
+        date_width = date_bbox[2] - date_bbox[0]
+        date_height = date_bbox[3] - date_bbox[1]
+        date_x = CANVAS_WIDTH - date_width - right_margin
+        date_y = CANVAS_HEIGHT - date_height - bottom_margin
+        draw.text((date_x, date_y), display_date, font=footer_font, fill=FOOTER_COLOR)
+
+        footer_bbox = draw.textbbox((0, 0), footer_text, font=footer_font)
+        footer_width = footer_bbox[2] - footer_bbox[0]
+        footer_height = footer_bbox[3] - footer_bbox[1]
+        footer_x = CANVAS_WIDTH - footer_width - right_margin
+        footer_y = date_y - footer_height - line_spacing
+        draw.text(
+            (footer_x, footer_y), footer_text, font=footer_font, fill=FOOTER_COLOR
+        )
+    _record_stage(timings, "draw", started)
+
+
+def _encode_output(
+    base_img, output_format: str, max_bytes: int | None, timings: dict = None
+) -> dict | None:
+    formats = [output_format]
+    if max_bytes:
+        formats += [f for f in FALLBACK_FORMATS if f != output_format]
+
+    # 所有格式都超過限制時，回傳其中最小的結果由呼叫端處理
+    result = None
+    for fmt in formats:
+        try:
+            data, encode_seconds = encode_image(base_img, fmt)
+            if timings is not None:
+                timings["encode"] = timings.get("encode", 0.0) + encode_seconds
+        except Exception as e:
+            logger.error(f"以 {fmt} 輸出圖片時發生錯誤: {e}")
+            continue
+        if result is not None and len(data) >= result["size"]:
+            continue
+        result = {
+            "data": data,
+            "format": fmt,
+            "extension": OUTPUT_EXTENSIONS[fmt],
+            "size": len(data),
+            "encode_seconds": encode_seconds,
+        }
+        if not max_bytes or len(data) <= max_bytes:
+            return result
+        logger.warning(
+            f"{fmt} 圖片大小 {len(data) / 1024:.0f} KB 超過上傳限制，改用其他格式"
+        )
+    return result
@@ -1,9 +1,29 @@
 # mongo_crud.py
 import logging
+import os
+from collections.abc import Callable
 from pymongo import MongoClient
 from pymongo.errors import PyMongoError
 from pymongo import ReturnDocument
 
+_clients: dict[str | None, MongoClient] = {}
+
+
+def get_client(uri: str | None = None) -> MongoClient:
+    """
+    取得共用的 MongoClient，同一個連線字串只會建立一個實例。
+
+    :param uri: 連線字串，預設使用環境變數 `MONGO_URI`。
+    """
+    if uri is None:
+        uri = os.getenv("MONGO_URI")
+    client = _clients.get(uri)
+    if client is None:
+        # connect=False: 第一次查詢時才連線，不拖慢啟動
+        client = MongoClient(uri, serverSelectionTimeoutMS=15000, connect=False)
+        _clients[uri] = client
+    return client
+
 
 class MongoCRUD:
     """
@@ -12,7 +32,7 @@ class MongoCRUD:
 
     def __init__(
         self,
-        client: MongoClient,
+        client: MongoClient | Callable[[], MongoClient],
         db_name: str,
         collection_name: str,
         logger: logging.Logger,
@@ -20,17 +40,34 @@ class MongoCRUD:
         """
         初始化 MongoDB 操作。
 
-        :param client: 一個 MongoClient 的實例。
+        :param client: 一個 MongoClient 的實例，或在第一次使用時才呼叫的工廠函式。
         :param db_name: 資料庫名稱。
         :param collection_name: 集合名稱。
         :param logger: 用於日誌記錄的 logger 實例。
         """
-        self.client = client
-        self.db = self.client[db_name]
-        self.collection = self.db[collection_name]
+        self._client = client
+        self.db_name = db_name
+        self.collection_name = collection_name
+        self._collection = None
         self.logger = logger
         self.logger.info(f"Handler for collection '{collection_name}' initialized.")
 
+    @property
+    def client(self) -> MongoClient:
+        if callable(self._client):
+            self._client = self._client()
+        return self._client
+
+    @property
+    def db(self):
+        return self.client[self.db_name]
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            self._collection = self.db[self.collection_name]
+        return self._collection
+
     def get(self, query: dict):
         """根據查詢條件獲取文件。"""
         self.logger.debug(f"Executing find with query: {query}")